@@ -0,0 +1,86 @@
+import aiohttp
+
+
+class CameraClient:
+    # long-lived HTTP client of lane cameras (Axis photo cameras and plate readers) with
+    # keep-alive connection pool, one per listener process
+    def __init__(self, limit: int = 32, limit_per_host: int = 2, timeout: float = 2, connect_timeout: float = 1,
+                 keepalive_timeout: float = 30):
+        self.__limit = limit
+        self.__limit_per_host = limit_per_host
+        self.__timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.__keepalive_timeout = keepalive_timeout
+        self.__session = None
+        self.__counters = {'requests': 0, 'created': 0, 'reused': 0}
+
+    async def _on_request_end(self, session, context, params):
+        self.__counters['requests'] += 1
+
+    async def _on_connection_create_end(self, session, context, params):
+        self.__counters['created'] += 1
+
+    async def _on_connection_reuseconn(self, session, context, params):
+        self.__counters['reused'] += 1
+
+    async def open(self):
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_end.append(self._on_request_end)
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+        connector = aiohttp.TCPConnector(limit=self.__limit, limit_per_host=self.__limit_per_host,
+                                         keepalive_timeout=self.__keepalive_timeout, ttl_dns_cache=3600, ssl=False)
+        self.__session = aiohttp.ClientSession(connector=connector, timeout=self.__timeout, raise_for_status=True,
+                                               trace_configs=[trace_config])
+        return self
+
+    async def close(self):
+        if not self.__session is None:
+            await self.__session.close()
+            self.__session = None
+
+    async def get(self, url: str, store=None):
+        # with image store response body is streamed to store and its key is returned
+        async with self.__session.get(url) as response:
+            if store is None:
+                return await response.read()
+            return await store.write(response.content.iter_chunked(store.chunk))
+
+    async def photo(self, ip: str, store=None):
+        return await self.get(f'http://{ip}/axis-cgi/jpg/image.cgi?camera=1&resolution=1024x768&compression=25', store)
+
+    async def plate_image(self, ip: str, store=None):
+        return await self.get(f'http://{ip}/module.php?m=sekuplate&p=getImage&img=/home/root/tmp/last_read.jpg', store)
+
+    async def plate_data(self, ip: str) -> bytes:
+        return await self.get(f'http://{ip}/module.php?m=sekuplate&p=letture')
+
+    async def mjpeg(self, ip: str, fps: int = 2, max_frame: int = 1048576):
+        # yields JPEG frames of Axis MJPEG stream, frames are cut by SOI/EOI markers,
+        # partial frame larger than max_frame is discarded so buffer stays bounded
+        url = f'http://{ip}/axis-cgi/mjpg/video.cgi?resolution=1024x768&compression=25&fps={fps}'
+        async with self.__session.get(url, timeout=aiohttp.ClientTimeout(total=None, sock_read=10)) as response:
+            buffer = bytearray()
+            async for chunk in response.content.iter_chunked(65536):
+                buffer += chunk
+                while True:
+                    start = buffer.find(b'\xff\xd8')
+                    if start < 0:
+                        # keep last byte, it may be first half of marker
+                        del buffer[:-1]
+                        break
+                    end = buffer.find(b'\xff\xd9', start + 2)
+                    if end < 0:
+                        del buffer[:start]
+                        if len(buffer) > max_frame:
+                            buffer.clear()
+                        break
+                    yield bytes(buffer[start:end + 2])
+                    del buffer[:end + 2]
+
+    # counters since previous call
+    def metrics(self) -> dict:
+        metrics = dict(self.__counters)
+        connections = metrics['created'] + metrics['reused']
+        metrics['reuse_ratio'] = metrics['reused']/connections if connections else None
+        self.__counters = dict.fromkeys(self.__counters, 0)
+        return metrics
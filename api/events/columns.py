@@ -0,0 +1,61 @@
+import asyncio
+from datetime import datetime
+
+
+class ColumnCache:
+    # process-wide copy of `is_column_get` rows (camera IPs and modes of lane columns).
+    # Warmed at start, row is dropped on `config.devices.changed` broadcast from webservice
+    # and reloaded when it is older than TTL
+    def __init__(self, dbconnector, ttl: int = 300):
+        self.__dbconnector = dbconnector
+        self.__ttl = ttl
+        self.__columns = {}
+        self.__loading = {}
+        # rows fetched before invalidation are not stored
+        self.__generation = 0
+        self.__counters = {'hits': 0, 'misses': 0, 'invalidated': 0}
+
+    async def warm(self):
+        # all columns in one request
+        columns = await self.__dbconnector.callproc('is_column_get', rows=-1, values=[None])
+        ts = datetime.now().timestamp()
+        for column in columns or []:
+            self.__columns[column['terId']] = (ts, column)
+        return self
+
+    async def get(self, ter_id: int) -> dict:
+        column = self.__columns.get(ter_id)
+        if not column is None and datetime.now().timestamp() - column[0] < self.__ttl:
+            self.__counters['hits'] += 1
+            return column[1]
+        self.__counters['misses'] += 1
+        # concurrent misses of one column share single SQL request
+        loading = self.__loading.get(ter_id)
+        if loading is None:
+            loading = self.__loading[ter_id] = asyncio.ensure_future(self._load(ter_id))
+        return await asyncio.shield(loading)
+
+    async def _load(self, ter_id: int) -> dict:
+        generation = self.__generation
+        try:
+            row = await self.__dbconnector.callproc('is_column_get', rows=1, values=[ter_id])
+            if not row is None and generation == self.__generation:
+                self.__columns[ter_id] = (datetime.now().timestamp(), row)
+            return row
+        finally:
+            self.__loading.pop(ter_id, None)
+
+    def invalidate(self, ter_id: int = None):
+        # without terId (configuration reload) all columns are dropped
+        self.__generation += 1
+        self.__counters['invalidated'] += 1
+        if ter_id is None:
+            self.__columns.clear()
+        else:
+            self.__columns.pop(int(ter_id), None)
+
+    # counters since previous call
+    def metrics(self) -> dict:
+        metrics = dict(self.__counters, columns=len(self.__columns))
+        self.__counters = dict.fromkeys(self.__counters, 0)
+        return metrics
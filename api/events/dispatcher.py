@@ -0,0 +1,82 @@
+import asyncio
+from collections import deque
+from datetime import datetime
+
+from integration.api.events.latency import LatencyHistogram
+
+
+class LaneDispatcher:
+    # runs events of different devices (lanes) concurrently while events of one device
+    # are processed strictly in arrival order. Number of accepted but not finished events
+    # is limited by prefetch, consumer waits in submit when limit is reached.
+    # AsyncAMQP.receive awaits callback of one delivery before it takes the next one and acknowledges
+    # message when callback returns, there is no handle to acknowledge it later. So submit returns as soon
+    # as event is queued in its lane, and accepted events are finished by join() on shutdown
+    def __init__(self, handler, prefetch: int = 8):
+        self.__handler = handler
+        self.__slots = asyncio.Semaphore(prefetch)
+        self.__lanes = {}
+        self.__tasks = set()
+        self.__closing = False
+        self.__max_depth = {}
+        # time from device signal (`ts` of event) to end of its handling, by routing key
+        self.__latency = {}
+
+    async def submit(self, redelivered, key, data):
+        await self.__slots.acquire()
+        if self.__closing:
+            # delivery is held until consumer is stopped, unacknowledged message is redelivered by broker
+            self.__slots.release()
+            await asyncio.get_event_loop().create_future()
+        lane = data.get('device_id') if isinstance(data, dict) else None
+        queue = self.__lanes.get(lane)
+        if queue is None:
+            queue = self.__lanes[lane] = deque()
+            task = asyncio.ensure_future(self._drain(lane, queue))
+            self.__tasks.add(task)
+            task.add_done_callback(self.__tasks.discard)
+        queue.append((redelivered, key, data))
+        self.__max_depth[lane] = max(self.__max_depth.get(lane, 0), len(queue))
+
+    async def _drain(self, lane, queue):
+        while queue:
+            redelivered, key, data = queue[0]
+            try:
+                await self.__handler(redelivered, key, data)
+            except Exception:
+                # handler logs own errors, lane must keep going
+                pass
+            finally:
+                queue.popleft()
+                self.__slots.release()
+                self._observe(key, data)
+        # lane is removed in the same step it is found empty, next event starts new lane
+        del self.__lanes[lane]
+
+    # waits for accepted events to be handled, lanes still running after timeout are cancelled
+    async def join(self, timeout: float = None):
+        self.__closing = True
+        if self.__tasks:
+            done, pending = await asyncio.wait(list(self.__tasks), timeout=timeout)
+            for task in pending:
+                task.cancel()
+        return sum(len(queue) for queue in self.__lanes.values())
+
+    def _observe(self, key, data):
+        ts = data.get('ts') if isinstance(data, dict) else None
+        if isinstance(ts, (int, float)):
+            histogram = self.__latency.get(key)
+            if histogram is None:
+                histogram = self.__latency[key] = LatencyHistogram()
+            histogram.observe(max(0.0, datetime.now().timestamp() - ts))
+
+    # latency histogram per routing key since previous call
+    def latency(self) -> dict:
+        return {key: histogram.metrics() for key, histogram in self.__latency.items()}
+
+    # queue depth per lane: current and max since previous call
+    def metrics(self) -> dict:
+        metrics = {lane: {'depth': len(self.__lanes[lane]) if lane in self.__lanes else 0, 'max_depth': depth}
+                   for lane, depth in self.__max_depth.items()}
+        self.__max_depth = {lane: len(queue) for lane, queue in self.__lanes.items()}
+        return metrics
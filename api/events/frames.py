@@ -0,0 +1,69 @@
+import asyncio
+from collections import deque
+from datetime import datetime
+
+
+class FrameBuffer:
+    # keeps last `size` JPEG frames of every camera that was asked for a frame, so photo of event
+    # is taken from memory instead of camera round-trip. Frames are pulled every `interval` seconds
+    # or read from MJPEG stream, camera that isn't asked for `idle` seconds stops being fed
+    def __init__(self, camera, size: int = 10, interval: float = 0.5, mode: str = 'pull', tolerance: float = 1.0,
+                 idle: float = 3600, max_frame: int = 1048576):
+        self.__camera = camera
+        self.__size = size
+        self.__interval = interval
+        self.__mode = mode
+        self.__tolerance = tolerance
+        self.__idle = idle
+        self.__max_frame = max_frame
+        self.__frames = {}
+        self.__used = {}
+        self.__feeders = {}
+
+    def watch(self, ip: str):
+        self.__used[ip] = datetime.now().timestamp()
+        if not ip in self.__feeders:
+            self.__frames[ip] = deque(maxlen=self.__size)
+            self.__feeders[ip] = asyncio.ensure_future(self._feed(ip))
+
+    def closest(self, ip: str, ts: float):
+        # frame nearest to event time within tolerance, None when camera has no such frame
+        self.watch(ip)
+        best = None
+        for frame_ts, frame in self.__frames[ip]:
+            if abs(frame_ts - ts) <= self.__tolerance and (best is None or abs(frame_ts - ts) < abs(best[0] - ts)):
+                best = (frame_ts, frame)
+        return None if best is None else best[1]
+
+    def _append(self, ip: str, frame: bytes):
+        if frame and len(frame) <= self.__max_frame:
+            self.__frames[ip].append((datetime.now().timestamp(), frame))
+
+    def _active(self, ip: str) -> bool:
+        return datetime.now().timestamp() - self.__used[ip] < self.__idle
+
+    async def _feed(self, ip: str):
+        try:
+            while self._active(ip):
+                try:
+                    if self.__mode == 'mjpeg':
+                        async for frame in self.__camera.mjpeg(ip, fps=max(1, round(1/self.__interval)), max_frame=self.__max_frame):
+                            self._append(ip, frame)
+                            if not self._active(ip):
+                                break
+                    else:
+                        self._append(ip, await self.__camera.photo(ip))
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    # camera is unavailable, event falls back to direct request
+                    pass
+                await asyncio.sleep(self.__interval)
+        finally:
+            del self.__feeders[ip]
+            del self.__frames[ip]
+
+    async def close(self):
+        for feeder in list(self.__feeders.values()):
+            feeder.cancel()
+        await asyncio.gather(*self.__feeders.values(), return_exceptions=True)
@@ -0,0 +1,74 @@
+import asyncio
+import hashlib
+import os
+import uuid
+
+
+class ImageStore:
+    # content-addressed JPEG store: image is streamed to disk in chunks while being hashed and
+    # is referenced by relative path `ab/cd/<sha256>.jpg`, same image is stored once.
+    # File I/O runs in default executor so slow disk doesn't stall event loop
+    def __init__(self, root: str, chunk: int = 65536, max_size: int = 10485760):
+        self.root = root
+        self.chunk = chunk
+        self.__max_size = max_size
+        os.makedirs(os.path.join(self.root, '.tmp'), exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def _commit(self, tmp: str, digest) -> str:
+        name = digest.hexdigest()
+        key = f'{name[0:2]}/{name[2:4]}/{name}.jpg'
+        path = self.path(key)
+        if os.path.exists(path):
+            os.remove(tmp)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp, path)
+        return key
+
+    def _discard(self, f, tmp: str):
+        f.close()
+        os.remove(tmp)
+
+    async def write(self, chunks) -> str:
+        # consumes async iterator of bytes chunks, returns key or None for empty response.
+        # Received data is written by `chunk` bytes
+        loop = asyncio.get_event_loop()
+        tmp = os.path.join(self.root, '.tmp', uuid.uuid4().hex)
+        digest = hashlib.sha256()
+        size = 0
+        pending = bytearray()
+        f = await loop.run_in_executor(None, open, tmp, 'wb')
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > self.__max_size:
+                    raise ValueError(f'image exceeds {self.__max_size} bytes')
+                digest.update(chunk)
+                pending += chunk
+                if len(pending) >= self.chunk:
+                    await loop.run_in_executor(None, f.write, bytes(pending))
+                    pending.clear()
+            if pending:
+                await loop.run_in_executor(None, f.write, bytes(pending))
+        except BaseException:
+            await loop.run_in_executor(None, self._discard, f, tmp)
+            raise
+        if not size:
+            await loop.run_in_executor(None, self._discard, f, tmp)
+            return None
+        await loop.run_in_executor(None, f.close)
+        return await loop.run_in_executor(None, self._commit, tmp, digest)
+
+    def _put(self, data: bytes) -> str:
+        tmp = os.path.join(self.root, '.tmp', uuid.uuid4().hex)
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        return self._commit(tmp, hashlib.sha256(data))
+
+    async def put(self, data: bytes) -> str:
+        if not data:
+            return None
+        return await asyncio.get_event_loop().run_in_executor(None, self._put, data)
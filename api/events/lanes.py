@@ -0,0 +1,514 @@
+import asyncio
+import base64
+import functools
+import json
+import os
+import signal
+import sys
+from datetime import date, datetime
+from typing import NamedTuple
+
+import toml
+import uvloop
+import setproctitle
+
+import configuration.settings as cs
+from utils.asyncamqp import AsyncAMQP, ChannelClosed, ChannelInvalidStateError
+from utils.asynclckhouse import AsyncClickHouse
+from utils.asynclog import AsyncLogger
+from utils.asyncsql import AsyncDBPool
+from utils.tbparser import parse_tb
+
+from integration.api.events.camera import CameraClient
+from integration.api.events.columns import ColumnCache
+from integration.api.events.dispatcher import LaneDispatcher
+from integration.api.events.frames import FrameBuffer
+from integration.api.events.images import ImageStore
+from integration.api.events.letture import parse_letture
+from integration.api.events.logsink import LogSink
+from integration.api.events.transactions import (BARRIER_OPENED, LOOP2_FREE,
+                                                 LOOP2_OCCUPIED, REVERSED,
+                                                 TransactionCache)
+
+LOG_QUERY = "INSERT INTO integration.integration_logs (logDate, logDateTime, logSource, logSourceModule, logLevel, logData, logDataType) VALUES"
+
+
+class Direction(NamedTuple):
+    # everything that differs between entry and exit lanes
+    name: str
+    listener: str
+    alias: str
+    queue: str
+    bindings: tuple
+    # routing key of incoming message -> handler `_process_<signal>_event`
+    signals: dict
+    # stored procedures of direction
+    procedures: dict
+    # routing keys of outgoing events
+    events: dict
+    # transition type -> (value, routing key) of OneShotEvent sent when vehicle leaves lane
+    oneshot: dict
+
+
+class OneShotEvent:
+    def __init__(self, value, device_ip, ampp_id):
+        self.__codename = 'OneShotEvent'
+        self.__value: str = value
+        self.__device_id = 0
+        self.__device_address = 0
+        self.__device_ip = cs.WS_SERVER_IP
+        self.__device_type = 0
+        self.__ampp_id = f'{ampp_id}'
+        self.__ampp_type = 1
+        self.__ts = datetime.now().timestamp()
+
+    @property
+    def instance(self):
+        return {'device_id': self.__device_id,
+                'device_address': self.__device_address,
+                'device_type': self.__device_type,
+                'codename': self.__codename,
+                'value': self.__value,
+                'ts': self.__ts,
+                'ampp_id': self.__ampp_id,
+                'ampp_type': self.__ampp_type,
+                'device_ip': self.__device_ip}
+
+
+class LaneListener:
+    # loop, barrier, reverse and command events of entry or exit lanes
+    def __init__(self, direction: Direction):
+        self.__direction = direction
+        self.__dbconnector_ws: object = None
+        self.__dbconnector_is: object = None
+        self.__amqpconnector_is: object = None
+        self.__clickhouseconnector_is: object = None
+        self.__logger: object = None
+        self.__eventloop: object = None
+        self.__eventsignal: bool = False
+        self.name = direction.listener
+        self.source = 'integration'
+        self.alias = direction.alias
+        self.__ampp_id = None
+        self.__server_ip = None
+        self.__dispatcher = None
+        self.__camera = None
+        self.__frames = None
+        self.__images = None
+        self.__logsink = None
+        self.__transactions = None
+        self.__columns = None
+        self.__metrics_interval = 60
+        self.__procedures = direction.procedures
+        self.__events = direction.events
+        self.__handlers = {key: getattr(self, f'_process_{event}_event') for key, event in direction.signals.items()}
+
+    @property
+    def eventloop(self):
+        return self.__eventloop
+
+    @eventloop.setter
+    def eventloop(self, value):
+        self.__eventloop = value
+
+    @eventloop.getter
+    def eventloop(self):
+        return self.__eventloop
+
+    @property
+    def eventsignal(self):
+        return self.__eventsignal
+
+    @eventsignal.setter
+    def eventsignal(self, v):
+        self.__eventsignal = v
+
+    @eventsignal.getter
+    def eventsignal(self):
+        return self.__eventsignal
+
+    async def _initialize(self):
+        setproctitle.setproctitle(self.alias)
+        configuration = toml.load(cs.CONFIG_FILE)
+        self.__ampp_id = configuration['ampp']['id']
+        self.__server_ip = configuration['wisepark']['server_ip']
+        # events of different lanes are processed concurrently, up to prefetch events at once
+        lane_config = configuration['integration'].get(self.__direction.name, {})
+        self.__dispatcher = LaneDispatcher(self._process, prefetch=lane_config.get('prefetch', 8))
+        self.__metrics_interval = lane_config.get('metrics_interval', 60)
+        # seconds given to accepted events to finish on shutdown
+        self.__drain_timeout = lane_config.get('drain_timeout', 10)
+        # transaction of lane is read from SQL only when lane wasn't seen since start
+        self.__transactions = TransactionCache(self._load_transaction)
+        self.__camera = CameraClient(**configuration['integration'].get('camera', {}))
+        frames_config = dict(configuration['integration'].get('frames', {}))
+        if frames_config.pop('enabled', False):
+            self.__frames = FrameBuffer(self.__camera, **frames_config)
+        images_config = dict(configuration['integration'].get('images', {}))
+        if images_config.pop('enabled', False):
+            self.__images = ImageStore(**images_config)
+        self.__dbconnector_is = AsyncDBPool(host=configuration['integration']['rdbs']['host'],
+                                            port=configuration['integration']['rdbs']['port'],
+                                            login=configuration['integration']['rdbs']['login'],
+                                            password=configuration['integration']['rdbs']['password'],
+                                            database=configuration['integration']['rdbs']['database'])
+        # lane column configuration is read from SQL only after it was changed or TTL expired
+        self.__columns = ColumnCache(self.__dbconnector_is, lane_config.get('columns_ttl', 300))
+        # limit pool size to max = 5
+        self.__dbconnector_ws = AsyncDBPool(host=configuration['wisepark']['rdbs']['host'],
+                                            port=configuration['wisepark']['rdbs']['port'],
+                                            login=configuration['wisepark']['rdbs']['login'],
+                                            password=configuration['wisepark']['rdbs']['password'],
+                                            database=configuration['wisepark']['rdbs']['database'],
+                                            min_size=1, max_size=5)
+        self.__amqpconnector_is = AsyncAMQP(login=configuration['integration']['amqp']['login'],
+                                            password=configuration['integration']['amqp']['password'],
+                                            host=configuration['integration']['amqp']['host'],
+                                            exchange_name=configuration['integration']['amqp']['exchange'],
+                                            exchange_type=configuration['integration']['amqp']['exchange_type'])
+        self.__clickhouseconnector_is = AsyncClickHouse(url=configuration['integration']['clickhouse']['url'],
+                                                        login=configuration['integration']['clickhouse']['login'],
+                                                        password=configuration['integration']['clickhouse']['password'],
+                                                        database=configuration['integration']['clickhouse']['integration'])
+        # log rows are written to ClickHouse in batches
+        self.__logsink = LogSink(self.__clickhouseconnector_is, **configuration['integration'].get('logsink', {})).open()
+        # initialize logger
+        self.__logger = AsyncLogger(f'{cs.LOG_PATH}/integration.log')
+        await self.__logger.getlogger()
+        await self.__logger.info({'module': self.name, 'info': 'Statrting...'})
+        # initialize connectors
+        connections_tasks = []
+        connections_tasks.append(self.__dbconnector_is.connect())
+        connections_tasks.append(self.__dbconnector_ws.connect())
+        connections_tasks.append(self.__amqpconnector_is.connect())
+        connections_tasks.append(self.__camera.open())
+        try:
+            await asyncio.gather(*connections_tasks)
+            await self.__columns.warm()
+            await self.__amqpconnector_is.bind(self.__direction.queue, list(self.__direction.bindings), durable=True)
+            await self.__dbconnector_is.callproc('is_processes_ins', rows=0, values=[self.name, 1, os.getpid(), datetime.now()])
+            await self.__logger.info({'module': self.name, 'info': 'Started'})
+            return self
+        except Exception as e:
+            await self.__logger.exception({'module': self.name})
+            raise e
+
+    # ClickHouse log row, written by log sink in batch
+    def _log(self, level, data, data_type):
+        return self.__logsink.execute(LOG_QUERY, (date.today(), datetime.now(), self.source, self.name, level, json.dumps(data, default=str), data_type))
+
+    async def _get_photo(self, ip, ts=None):
+        log_tasks = []
+        try:
+            # buffered frame of event time, camera is requested only when there is no such frame
+            frame = self.__frames.closest(ip, ts) if not self.__frames is None and not ts is None else None
+            if self.__images is None:
+                result_raw = frame if not frame is None else await self.__camera.photo(ip)
+                result = base64.b64encode(result_raw)
+                fetched = {'fetched_img_bytes': len(result_raw) if result_raw else 0}
+            else:
+                # image is streamed to store, only its key is passed to SQL
+                result = await self.__images.put(frame) if not frame is None else await self.__camera.photo(ip, self.__images)
+                fetched = {'image_key': result}
+            log_tasks.append(self._log('debug', fetched, 'axis.data'))
+            log_tasks.append(self.__logger.debug(dict({'module': self.name}, **fetched)))
+            return result, log_tasks
+        except Exception as e:
+            log_tasks.append(self._log('exception', parse_tb(e), 'traceback.data'))
+            log_tasks.append(self.__logger.exception({'module': self.name}))
+            return None, log_tasks
+
+    async def _get_plate_image(self, ip):
+        log_tasks = []
+        try:
+            if self.__images is None:
+                result_raw = await self.__camera.plate_image(ip)
+                result = None
+                if result_raw:
+                    result = base64.b64encode(result_raw)
+                fetched = {'fetched_img_bytes': len(result_raw) if result_raw else 0}
+            else:
+                result = await self.__camera.plate_image(ip, self.__images)
+                fetched = {'image_key': result}
+            # debugging logs
+            log_tasks.append(self._log('debug', {'image': True if result else False}, 'traceback.data'))
+            log_tasks.append(self.__logger.debug(dict({'module': self.name}, **fetched)))
+            return result, log_tasks
+        except Exception as e:
+            log_tasks.append(self._log('exception', parse_tb(e), 'traceback.data'))
+            log_tasks.append(self.__logger.exception({'module': self.name}))
+            return None, log_tasks
+
+    async def _get_plate_data(self, ip, ts):
+        log_tasks = []
+        # default unsuccessfull output
+        result_out = {'confidence': 0, 'plate': None, 'date': datetime.now()}
+        try:
+            data = await self.__camera.plate_data(ip)
+            result = parse_letture(data)
+            if ts - result['date'].timestamp() <= 10:
+                result_out = result
+            log_tasks.append(self._log('debug', result, 'bs4_fetched.data'))
+            log_tasks.append(self.__logger.debug({'module': self.name, 'plate_data': result_out}))
+        except Exception as e:
+            log_tasks.append(self._log('exception', parse_tb(e), 'traceback.data'))
+            log_tasks.append(self.__logger.exception({'module': self.name}))
+        return result_out, log_tasks
+
+    async def _load_transaction(self, device_id):
+        return await self.__dbconnector_is.callproc(self.__procedures['get'], rows=1, values=[device_id, 0])
+
+    async def _send(self, data, event):
+        await self.__amqpconnector_is.send(data=data, persistent=True, keys=[self.__events[event]], priority=10)
+
+    async def _process_loop1_event(self, data, device):
+        log_tasks = []
+        log_tasks.append(self._log('debug', data, 'amqp.data'))
+        log_tasks.append(self.__logger.debug({'module': self.name, 'amqp_incoming': json.dumps(data)}))
+        if data['value'] == 'OCCUPIED':
+            photo1left, photo_log_tasks = await self._get_photo(device['camPhoto1'], data['ts'])
+            log_tasks.extend(photo_log_tasks)
+            self.__transactions.open(data['device_id'], data['tra_uid'], data['ts'])
+            tasks = []
+            tasks.append(self.__dbconnector_is.callproc(self.__procedures['loop1'], rows=0, values=[data['tra_uid'], data['act_uid'], data['device_id'], datetime.fromtimestamp(data['ts'])]))
+            tasks.append(self.__dbconnector_is.callproc('is_photo_ins', rows=0, values=[data['tra_uid'], data['act_uid'],
+                                                                                        photo1left, data['device_id'], device['camPhoto1'], datetime.fromtimestamp(data['ts'])]))
+            tasks.append(self._send(data, 'loop1.occupied'))
+            await asyncio.gather(*tasks)
+        elif data['value'] == 'FREE':
+            temp_data = await self.__transactions.get(data['device_id'])
+            log_tasks.append(self._log('debug', temp_data, 'sql.data'))
+            log_tasks.append(self.__logger.debug({'module': self.name, 'temp_data_extracted': json.dumps(temp_data)}))
+            if not temp_data is None:
+                data['tra_uid'] = temp_data['transactionUID']
+            await self._send(data, 'loop1.free')
+        await asyncio.gather(*log_tasks, return_exceptions=True)
+
+    async def _process_barrier_event(self, data, device):
+        log_tasks = []
+        log_tasks.append(self._log('debug', data, 'amqp.data'))
+        log_tasks.append(self.__logger.debug({'module': self.name, 'amqp_incoming': json.dumps(data)}))
+        if data['value'] == 'OPENED':
+            pre_tasks = []
+            pre_tasks.append(self.__transactions.get(data['device_id']))
+            pre_tasks.append(self.__dbconnector_ws.callproc(self.__procedures['transit'], rows=1, values=[data['device_id'], int(data['ts'])]))
+            pre_tasks.append(self._get_photo(device['camPhoto1'], data['ts']))
+            pre_tasks.append(self._get_plate_data(device['camPlate'], data['ts']))
+            pre_tasks.append(self._get_plate_image(device['camPlate']))
+            temp_data, transit_data, photo_out, plate_data_out, plate_image_out = await asyncio.gather(*pre_tasks)
+            log_tasks.append(self.__logger.debug({'module': self.name, 'sql_fetched': json.dumps(temp_data)}))
+            log_tasks.append(self._log('debug', temp_data, 'sql.data'))
+            photo2left, photo_log_tasks = photo_out
+            # fetched plate reading
+            plate_data, plate_data_log_tasks = plate_data_out
+            # fetched image
+            plate_image, plate_image_log_tasks = plate_image_out
+            log_tasks.extend(photo_log_tasks)
+            log_tasks.extend(plate_data_log_tasks)
+            log_tasks.extend(plate_image_log_tasks)
+            if temp_data['transitionType'] != 'CHALLENGED':
+                self.__transactions.advance(data['device_id'], BARRIER_OPENED, data['ts'], transit_data.get('transitionType', None))
+                post_tasks = []
+                post_tasks.append(self.__dbconnector_is.callproc(self.__procedures['barrier'], rows=0, values=[data['device_id'], data['act_uid'], transit_data.get('transitionType', None),
+                                                                                                             json.dumps(transit_data, default=str), datetime.fromtimestamp(data['ts'])]))
+                post_tasks.append(self.__dbconnector_is.callproc('is_photo_ins', rows=0, values=[temp_data['transactionUID'],
+                                                                                                 data['act_uid'], photo2left, data['device_id'], device['camPhoto1'], datetime.fromtimestamp(data['ts'])]))
+                post_tasks.append(self.__dbconnector_is.callproc('is_plate_ins', rows=0, values=[temp_data['transactionUID'], data['act_uid'], data['device_id'], plate_image,
+                                                                                                 plate_data['confidence'], plate_data['plate'], plate_data['date']]))
+                data['tra_uid'] = temp_data['transactionUID']
+                post_tasks.append(self._send(data, 'barrier.opened'))
+                await asyncio.gather(*post_tasks)
+        elif data['value'] == 'CLOSED':
+            temp_data = await self.__transactions.get(data['device_id'])
+            log_tasks.append(self.__logger.debug({'module': self.name, 'sql_retrieved': json.dumps(temp_data)}))
+            log_tasks.append(self._log('debug', temp_data, 'sql.data'))
+            if not temp_data is None:
+                data['tra_uid'] = temp_data['transactionUID']
+            await self._send(data, 'barrier.closed')
+        await asyncio.gather(*log_tasks, return_exceptions=True)
+
+    # simulate as normal barrier event
+    async def _process_command_event(self, data, device):
+        log_tasks = []
+        pre_tasks = []
+        pre_tasks.append(self.__transactions.get(data['device_id']))
+        pre_tasks.append(self._get_photo(device['camPhoto1'], data['ts']))
+        pre_tasks.append(self._get_plate_data(device['camPlate'], data['ts']))
+        pre_tasks.append(self._get_plate_image(device['camPlate']))
+        temp_data, photo_out, plate_data_out, plate_image_out = await asyncio.gather(*pre_tasks)
+        photo2left, photo_log_tasks = photo_out
+        plate_data, plate_data_log_tasks = plate_data_out
+        plate_image, plate_image_log_tasks = plate_image_out
+        log_tasks.extend(photo_log_tasks)
+        log_tasks.extend(plate_data_log_tasks)
+        log_tasks.extend(plate_image_log_tasks)
+        log_tasks.append(self.__logger.debug({'module': self.name, 'sql_retrieved': json.dumps(temp_data)}))
+        log_tasks.append(self._log('debug', temp_data, 'sql.data'))
+        transit_data = {'transitionId': 0, 'transitionTS': datetime.now(), 'transitionArea': device['areaId'],
+                        'transitionPlate': plate_data['plate'], 'transionStatus': 1, 'transitionTariff': -1,
+                        'transitionTicket': '', 'subscriptionTicket': '', 'transitionType': 'CHALLENGED', 'transitionFine': 0}
+        self.__transactions.advance(data['device_id'], BARRIER_OPENED, data['ts'], 'CHALLENGED')
+        post_tasks = []
+        post_tasks.append(self.__dbconnector_is.callproc(self.__procedures['command'], rows=0, values=[data['device_id'], data['act_uid'],
+                                                                                                     json.dumps(transit_data, default=str), datetime.fromtimestamp(data['ts'])]))
+        post_tasks.append(self.__dbconnector_is.callproc('is_photo_ins', rows=0, values=[temp_data['transactionUID'],
+                                                                                         data['act_uid'], photo2left, data['device_id'], device['camPhoto1'], datetime.fromtimestamp(data['ts'])]))
+        post_tasks.append(self.__dbconnector_is.callproc('is_plate_ins', rows=0, values=[temp_data['transactionUID'], data['act_uid'], data['device_id'], plate_image,
+                                                                                         plate_data['confidence'], plate_data['plate'], plate_data['date']]))
+        if not temp_data is None:
+            data['tra_uid'] = temp_data['transactionUID']
+        post_tasks.append(self._send(data, 'barrier.opened'))
+        await asyncio.gather(*post_tasks)
+        await asyncio.gather(*log_tasks, return_exceptions=True)
+
+    async def _process_loop2_event(self, data, device):
+        if data['value'] == 'OCCUPIED':
+            pre_tasks = []
+            pre_tasks.append(self.__transactions.get(data['device_id']))
+            pre_tasks.append(self._get_photo(device['camPhoto2'], data['ts']))
+            temp_data, photo_out = await asyncio.gather(*pre_tasks)
+            photo3right, photo_log_tasks = photo_out
+            self.__transactions.advance(data['device_id'], LOOP2_OCCUPIED, data['ts'])
+            post_tasks = []
+            post_tasks.append(self.__dbconnector_is.callproc(self.__procedures['loop2'], rows=0, values=[data['device_id'], data['act_uid'], datetime.fromtimestamp(data['ts'])]))
+            post_tasks.append(self.__dbconnector_is.callproc('is_photo_ins', rows=0, values=[temp_data['transactionUID'],
+                                                                                             data['act_uid'], photo3right, data['device_id'], device['camPhoto2'], datetime.fromtimestamp(data['ts'])]))
+            data['tra_uid'] = temp_data['transactionUID']
+            post_tasks.append(self._send(data, 'loop2.occupied'))
+            await asyncio.gather(*post_tasks)
+            await asyncio.gather(*photo_log_tasks, return_exceptions=True)
+        elif data['value'] == 'FREE':
+            tasks = []
+            # expect that loop2 was passed and session was closed
+            temp_data = await self.__transactions.get(data['device_id'])
+            self.__transactions.advance(data['device_id'], LOOP2_FREE, data['ts'])
+            data['tra_uid'] = temp_data['transactionUID']
+            transition_type = 'CHALLENGED' if temp_data['transitionType'] == 'CHALLENGED' else 'OCCASIONAL'
+            oneshot = self.__direction.oneshot.get(transition_type)
+            if not oneshot is None:
+                value, key = oneshot
+                event = OneShotEvent(value, data['device_ip'], data['ampp_id'])
+                tasks.append(self.__amqpconnector_is.send(data=event.instance, persistent=True, keys=[key], priority=10))
+            tasks.append(self._send(data, 'challenged' if transition_type == 'CHALLENGED' else 'loop2.free'))
+            tasks.append(self.__dbconnector_is.callproc(self.__procedures['confirm'], rows=0, values=[data['device_id'], datetime.fromtimestamp(data['ts'])]))
+            await asyncio.gather(*tasks)
+
+    async def _process_reverse_event(self, data, device):
+        pre_tasks = []
+        pre_tasks.append(self.__dbconnector_ws.callproc(self.__procedures['transit'], rows=1, values=[data['device_id'], int(data['ts'])]))
+        pre_tasks.append(self.__transactions.get(data['device_id']))
+        transit_data, temp_data = await asyncio.gather(*pre_tasks)
+        self.__transactions.advance(data['device_id'], REVERSED, data['ts'])
+        post_tasks = []
+        if not temp_data is None:
+            data['tra_uid'] = temp_data['transactionUID']
+        post_tasks.append(self._send(data, 'reverse'))
+        post_tasks.append(self.__dbconnector_is.callproc(self.__procedures['reverse'], rows=0, values=[data['device_id'], data['act_uid'],
+                                                                                                     json.dumps(transit_data, default=str), datetime.fromtimestamp(data['ts'])]))
+        await asyncio.gather(*post_tasks)
+
+    async def _process_lostticket_event(self, data, device):
+        pre_tasks = []
+        pre_tasks.append(self.__dbconnector_ws.callproc(self.__procedures['transit'], rows=1, values=[data['device_id'], int(data['ts'])]))
+        pre_tasks.append(self.__dbconnector_ws.callproc('wp_payment_get', rows=1, values=[data['device_id'], int(data['ts'])]))
+        transit_data, payment_data = await asyncio.gather(*pre_tasks)
+        post_tasks = []
+        if not payment_data is None and int(payment_data['payPaid']) == 2500:
+            if not transit_data is None:
+                # transaction is read back right after it is written
+                await self.__dbconnector_is.callproc(self.__procedures['lost'], rows=0, values=[data['tra_uid'], data['device_id'], json.dumps(transit_data, default=str), datetime.fromtimestamp(data['ts'])])
+        temp_data = await self.__dbconnector_is.callproc(self.__procedures['get'], rows=1, values=[data['device_id'], 1])
+        data['tra_uid'] = temp_data['transactionUID']
+        post_tasks.append(self._send(data, 'barrier.opened'))
+        await asyncio.gather(*post_tasks)
+
+    async def _process(self, redelivered, key, data):
+        try:
+            if key == 'config.devices.changed':
+                self.__columns.invalidate(data.get('ter_id'))
+                return
+            handler = self.__handlers.get(key)
+            if handler is None:
+                return
+            device = await self.__columns.get(data['device_id'])
+            await handler(data, device)
+        except Exception as e:
+            tasks = []
+            tasks.append(self.__logger.exception({'module': self.name}))
+            # clickhouse logging
+            tasks.append(self._log('exception', parse_tb(e), 'traceback'))
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _metrics(self):
+        while not self.eventsignal:
+            await asyncio.sleep(self.__metrics_interval)
+            await self.__logger.info({'module': self.name, 'lanes': self.__dispatcher.metrics(), 'latency': self.__dispatcher.latency(), 'camera': self.__camera.metrics(), 'logsink': self.__logsink.metrics(),
+                                     'transactions': self.__transactions.metrics(), 'columns': self.__columns.metrics()})
+
+    # dispatcher
+    async def _dispatch(self):
+        asyncio.ensure_future(self._metrics())
+        while not self.eventsignal:
+            await self.__dbconnector_is.callproc('is_processes_upd', rows=0, values=[self.name, 1, datetime.now()])
+            try:
+                await self.__amqpconnector_is.receive(self.__dispatcher.submit)
+            # broker channel drop doesn't stop the listener, consumption is started again
+            except (ChannelClosed, ChannelInvalidStateError):
+                pass
+            except asyncio.CancelledError:
+                pass
+        else:
+            await self.__dbconnector_is.callproc('is_processes_upd', rows=0, values=[self.name, 0, datetime.now()])
+
+    async def _signal_cleanup(self):
+        await self.__logger.warning({'module': self.name, 'msg': 'Shutting down'})
+        closing_tasks = []
+        closing_tasks.append(self.__dbconnector_is.disconnect())
+        closing_tasks.append(self.__dbconnector_ws.disconnect())
+        closing_tasks.append(self.__amqpconnector_is.disconnect())
+        if not self.__frames is None:
+            closing_tasks.append(self.__frames.close())
+        closing_tasks.append(self.__camera.close())
+        closing_tasks.append(self.__logsink.close())
+        closing_tasks.append(self.__logger.shutdown())
+        await asyncio.gather(*closing_tasks, return_exceptions=True)
+
+    async def _signal_handler(self, signal):
+        # stop while loop coroutine
+        self.eventsignal = True
+        # events already accepted by lanes are finished first, new deliveries are held unacknowledged
+        unfinished = await self.__dispatcher.join(self.__drain_timeout)
+        if unfinished:
+            await self.__logger.warning({'module': self.name, 'msg': 'Lanes stopped with unfinished events', 'events': unfinished})
+        # log sink flusher is stopped by its close() in cleanup
+        tasks = [task for task in asyncio.all_tasks(self.eventloop) if task is not
+                 asyncio.tasks.current_task() and task is not self.__logsink.flusher]
+        for t in tasks:
+            t.cancel()
+        # buffered log rows are flushed before loop is stopped
+        await asyncio.gather(self._signal_cleanup(), return_exceptions=True)
+        # perform eventloop shutdown
+        try:
+            self.eventloop.stop()
+            self.eventloop.close()
+        except:
+            pass
+        # close the forked process
+        sys.exit(0)
+
+    def run(self):
+        # use own event loop
+        uvloop.install()
+        self.eventloop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.eventloop)
+        signals = (signal.SIGHUP, signal.SIGTERM, signal.SIGINT)
+        # add signal handler to loop
+        for s in signals:
+            self.eventloop.add_signal_handler(s, functools.partial(asyncio.ensure_future,
+                                                                   self._signal_handler(s)))
+        # try-except statement
+        try:
+            self.eventloop.run_until_complete(self._initialize())
+            self.eventloop.run_until_complete(self._dispatch())
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,37 @@
+import bisect
+
+# upper bounds of buckets in seconds, last bucket is unbounded
+BOUNDS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class LatencyHistogram:
+    # fixed-bucket histogram of event latencies, percentiles are upper bounds of their buckets
+    def __init__(self, bounds: tuple = BOUNDS):
+        self.__bounds = tuple(bounds)
+        self.__counts = [0]*(len(self.__bounds) + 1)
+        self.__max = 0.0
+
+    def observe(self, seconds: float):
+        self.__counts[bisect.bisect_left(self.__bounds, seconds)] += 1
+        self.__max = max(self.__max, seconds)
+
+    def _percentile(self, q: float, count: int):
+        rank = q*count
+        seen = 0
+        for i, n in enumerate(self.__counts):
+            seen += n
+            if seen >= rank:
+                return self.__bounds[i] if i < len(self.__bounds) else self.__max
+        return self.__max
+
+    # observations since previous call
+    def metrics(self) -> dict:
+        count = sum(self.__counts)
+        metrics = {'count': count,
+                   'buckets': {f'le_{b}': n for b, n in zip(self.__bounds + ('inf',), self.__counts) if n},
+                   'p50': self._percentile(0.5, count) if count else None,
+                   'p95': self._percentile(0.95, count) if count else None,
+                   'max': self.__max if count else None}
+        self.__counts = [0]*(len(self.__bounds) + 1)
+        self.__max = 0.0
+        return metrics
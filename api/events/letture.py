@@ -0,0 +1,68 @@
+import re
+from datetime import datetime
+
+# two-cell rows of sekuplate `letture` table: <tr><td>NAME</td><td>VALUE</td></tr>
+ROW = re.compile(rb'<tr[^>]*>\s*<td[^>]*>([^<]*)</td>\s*<td[^>]*>([^<]*)</td>\s*</tr>', re.IGNORECASE)
+ISO_DATE = re.compile(r'(\d{4})-(\d{2})-(\d{2})$')
+FIELDS = ('OCR SCORE', 'PLATE', 'DATE', 'HOUR')
+
+
+def _table_regex(data: bytes) -> dict:
+    return {name.strip().decode(errors='replace'): value.strip().decode(errors='replace') for name, value in ROW.findall(data)}
+
+
+def _table_bs4(data: bytes) -> dict:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(data, 'html.parser')
+    table_dict = {}
+    for row in soup.findAll('tr'):
+        aux = row.findAll('td')
+        table_dict[aux[0].string] = aux[1].string
+    return table_dict
+
+
+def _date(date: str, hour: str) -> datetime:
+    match = ISO_DATE.match(date)
+    if match:
+        return datetime(int(match[1]), int(match[2]), int(match[3]), int(hour[0:2]), int(hour[3:5]), int(hour[6:8]))
+    # other date layouts keep generic parser semantics
+    from dateutil import parser as dp
+    return dp.parse(f"{date} {hour[0:2]}:{hour[3:5]}:{hour[6:8]}")
+
+
+def parse_letture(data: bytes) -> dict:
+    # plate reading of sekuplate `letture` page, BeautifulSoup is used only when page doesn't match known layout
+    table_dict = _table_regex(data)
+    if not all(table_dict.get(f) for f in FIELDS):
+        table_dict = _table_bs4(data)
+    return {'confidence': float(table_dict['OCR SCORE'])*100,
+            'plate': table_dict['PLATE'],
+            'date': _date(table_dict['DATE'], table_dict['HOUR'])}
+
+
+if __name__ == '__main__':
+    # benchmark against BeautifulSoup path, captured pages can be passed as arguments
+    import sys
+    import timeit
+    from dateutil import parser as dp
+
+    pages = [open(path, 'rb').read() for path in sys.argv[1:]] or [
+        b'<html><body><table>'
+        b'<tr><td>PLATE</td><td>A123BC77</td></tr>'
+        b'<tr><td>OCR SCORE</td><td>0.93</td></tr>'
+        b'<tr><td>DATE</td><td>2020-06-15</td></tr>'
+        b'<tr><td>HOUR</td><td>12:34:56</td></tr>'
+        b'<tr><td>DIRECTION</td><td>IN</td></tr>'
+        b'</table></body></html>']
+
+    def bs4_path(data):
+        table_dict = _table_bs4(data)
+        return {'confidence': float(table_dict['OCR SCORE'])*100,
+                'plate': table_dict['PLATE'],
+                'date': dp.parse(f"{table_dict['DATE']} {table_dict['HOUR'][0:2]}:{table_dict['HOUR'][3:5]}:{table_dict['HOUR'][6:8]}")}
+
+    number = 1000
+    for data in pages:
+        for name, func in (('bs4 + dateutil', bs4_path), ('parse_letture', parse_letture)):
+            elapsed = timeit.timeit(lambda: func(data), number=number)
+            print(f'{name:<16} {elapsed/number*1e6:8.1f} us/page')
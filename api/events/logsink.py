@@ -0,0 +1,102 @@
+import asyncio
+from collections import deque
+
+
+class LogSink:
+    # buffers ClickHouse log rows per INSERT statement and writes them as one multi-row INSERT
+    # every `interval` seconds or as soon as `size` rows are buffered.
+    # Buffer of statement is bounded by `max_rows`, oldest rows are dropped when it is full.
+    # Failed INSERT is sent again by next flushes before newer rows, its rows are counted as failed
+    # and dropped after `retries` attempts
+    def __init__(self, clickhouse, size: int = 500, interval: float = 1.0, max_rows: int = 10000, retries: int = 3):
+        self.__clickhouse = clickhouse
+        self.__size = size
+        self.__interval = interval
+        self.__max_rows = max_rows
+        self.__retries = retries
+        self.__buffers = {}
+        # statement -> [attempts, rows] of INSERT that failed
+        self.__retrying = {}
+        self.__full = None
+        self.__flusher = None
+        self.__closing = False
+        self.__counters = {'written': 0, 'dropped': 0, 'failed': 0, 'inserts': 0}
+
+    @property
+    def flusher(self):
+        return self.__flusher
+
+    def open(self):
+        self.__full = asyncio.Event()
+        self.__flusher = asyncio.ensure_future(self._run())
+        return self
+
+    def put(self, query: str, *rows):
+        buffer = self.__buffers.get(query)
+        if buffer is None:
+            buffer = self.__buffers[query] = deque(maxlen=self.__max_rows)
+        for row in rows:
+            if len(buffer) == self.__max_rows:
+                self.__counters['dropped'] += 1
+            buffer.append(row)
+        if len(buffer) >= self.__size:
+            self.__full.set()
+
+    # drop-in replacement of AsyncClickHouse.execute for INSERT statements, doesn't wait for network
+    async def execute(self, query: str, *rows):
+        self.put(query, *rows)
+
+    async def flush(self):
+        for query, buffer in list(self.__buffers.items()):
+            # batch that failed before goes first, newer rows wait while it keeps failing
+            while True:
+                batch = self.__retrying.pop(query, None)
+                if batch is None:
+                    if not buffer:
+                        break
+                    batch = [0, list(buffer)]
+                    buffer.clear()
+                if not await self._insert(query, batch):
+                    break
+
+    async def _insert(self, query, batch) -> bool:
+        attempts, rows = batch
+        try:
+            await self.__clickhouse.execute(query, *rows)
+            self.__counters['written'] += len(rows)
+            self.__counters['inserts'] += 1
+            return True
+        except asyncio.CancelledError:
+            self.__retrying[query] = batch
+            raise
+        except Exception:
+            if attempts + 1 < self.__retries:
+                self.__retrying[query] = [attempts + 1, rows]
+            else:
+                self.__counters['failed'] += len(rows)
+            return False
+
+    async def _run(self):
+        while not self.__closing:
+            try:
+                await asyncio.wait_for(self.__full.wait(), self.__interval)
+            except asyncio.TimeoutError:
+                pass
+            self.__full.clear()
+            await self.flush()
+
+    async def close(self):
+        # flusher is woken up and exits after last flush
+        if not self.__flusher is None:
+            self.__closing = True
+            self.__full.set()
+            await asyncio.gather(self.__flusher, return_exceptions=True)
+            self.__flusher = None
+        await self.flush()
+
+    # counters since previous call
+    def metrics(self) -> dict:
+        metrics = dict(self.__counters, buffered=sum(len(b) for b in self.__buffers.values()),
+                       retrying=sum(len(b[1]) for b in self.__retrying.values()))
+        self.__counters = dict.fromkeys(self.__counters, 0)
+        return metrics
@@ -0,0 +1,77 @@
+import asyncio
+from datetime import datetime
+
+LOOP1_OCCUPIED = 'LOOP1_OCCUPIED'
+BARRIER_OPENED = 'BARRIER_OPENED'
+LOOP2_OCCUPIED = 'LOOP2_OCCUPIED'
+LOOP2_FREE = 'LOOP2_FREE'
+REVERSED = 'REVERSED'
+# unknown state of transaction restored from SQL
+RECOVERED = 'RECOVERED'
+
+# expected previous state of each transition
+TRANSITIONS = {BARRIER_OPENED: (LOOP1_OCCUPIED, RECOVERED),
+               LOOP2_OCCUPIED: (BARRIER_OPENED, RECOVERED),
+               LOOP2_FREE: (LOOP2_OCCUPIED, RECOVERED),
+               REVERSED: (LOOP1_OCCUPIED, BARRIER_OPENED, RECOVERED)}
+
+
+class TransactionCache:
+    # last transaction of every lane kept in memory, so handlers don't read it back from SQL.
+    # Lane moves through LOOP1_OCCUPIED -> BARRIER_OPENED -> LOOP2_OCCUPIED -> LOOP2_FREE and keeps
+    # its last transaction until next LOOP1_OCCUPIED. SQL is read by `loader` only for lane that wasn't
+    # seen since process start, writes are still done by handlers
+    def __init__(self, loader):
+        self.__loader = loader
+        self.__lanes = {}
+        self.__loading = {}
+        self.__counters = {'hits': 0, 'recovered': 0, 'opened': 0, 'unexpected': 0}
+
+    async def get(self, device_id: int) -> dict:
+        # row of active transaction in form of `is_entry_get`/`is_exit_get` result or None
+        transaction = self.__lanes.get(device_id)
+        if not transaction is None:
+            self.__counters['hits'] += 1
+            return transaction
+        # concurrent misses of one lane share single SQL request
+        loading = self.__loading.get(device_id)
+        if loading is None:
+            loading = self.__loading[device_id] = asyncio.ensure_future(self._recover(device_id))
+        return await asyncio.shield(loading)
+
+    async def _recover(self, device_id: int) -> dict:
+        try:
+            row = await self.__loader(device_id)
+            # lane could be opened by handler while row was being fetched
+            if not row is None and not device_id in self.__lanes:
+                self.__lanes[device_id] = {'transactionUID': row['transactionUID'], 'transitionType': row.get('transitionType'),
+                                           'state': RECOVERED, 'ts': datetime.now().timestamp()}
+                self.__counters['recovered'] += 1
+            return self.__lanes.get(device_id)
+        finally:
+            del self.__loading[device_id]
+
+    def open(self, device_id: int, tra_uid: str, ts: float) -> dict:
+        transaction = self.__lanes[device_id] = {'transactionUID': tra_uid, 'transitionType': None, 'state': LOOP1_OCCUPIED, 'ts': ts}
+        self.__counters['opened'] += 1
+        return transaction
+
+    def advance(self, device_id: int, state: str, ts: float, transition_type: str = None) -> dict:
+        # out of order signal doesn't break lane, it's only counted
+        transaction = self.__lanes.get(device_id)
+        if transaction is None:
+            self.__counters['unexpected'] += 1
+            return None
+        if not transaction['state'] in TRANSITIONS.get(state, ()):
+            self.__counters['unexpected'] += 1
+        transaction['state'] = state
+        transaction['ts'] = ts
+        if not transition_type is None:
+            transaction['transitionType'] = transition_type
+        return transaction
+
+    # counters since previous call
+    def metrics(self) -> dict:
+        metrics = dict(self.__counters, lanes=len(self.__lanes))
+        self.__counters = dict.fromkeys(self.__counters, 0)
+        return metrics
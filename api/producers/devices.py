@@ -0,0 +1,75 @@
+import asyncio
+from datetime import datetime
+
+
+class DeviceRegistry:
+    # process-wide copy of `is_device_get` indexed by terId and IP
+    # reloaded on `config.devices.changed` broadcast from webservice or when TTL expires
+    def __init__(self, dbconnector, ttl: int = 3600):
+        self.__dbconnector = dbconnector
+        self.__ttl = ttl
+        self.__devices = []
+        self.__by_id = {}
+        self.__by_ip = {}
+        self.__loaded_ts = 0
+        self.__version = 0
+        self.__lock = asyncio.Lock()
+        # terIds named by change broadcasts, None stands for all devices (configuration reload)
+        self.__changed = set()
+
+    @property
+    def devices(self):
+        return self.__devices
+
+    @property
+    def version(self):
+        return self.__version
+
+    # terIds changed through webservice since previous call
+    def changed(self) -> set:
+        changed, self.__changed = self.__changed, set()
+        return changed
+
+    def get(self, ter_id: int):
+        return self.__by_id.get(ter_id)
+
+    def by_ip(self, ip: str):
+        return self.__by_ip.get(ip)
+
+    async def load(self):
+        async with self.__lock:
+            devices = await self.__dbconnector.callproc('is_device_get', rows=-1, values=[None, None, None, None, None])
+            self.__devices = devices if not devices is None else []
+            self.__by_id = {d['terId']: d for d in self.__devices}
+            self.__by_ip = {d['terIp']: d for d in self.__devices}
+            self.__loaded_ts = datetime.now().timestamp()
+            self.__version += 1
+        return self
+
+    async def refresh(self):
+        if datetime.now().timestamp() - self.__loaded_ts >= self.__ttl:
+            await self.load()
+        return self
+
+    async def _process(self, redelivered, key, data):
+        ter_id = data.get('ter_id') if isinstance(data, dict) else None
+        self.__changed.add(int(ter_id) if not ter_id is None else None)
+        await self.load()
+
+    # consume change notifications on own non-durable queue, queue is bound again after
+    # channel error so process doesn't silently fall back to TTL-only reload
+    async def listen(self, amqpconnector, name: str, logger, retry: float = 5):
+        rebind = False
+        while True:
+            try:
+                await amqpconnector.bind(f'{name}_devices', ['config.devices.changed'], durable=False)
+                # broadcasts sent while queue was unbound are lost
+                if rebind:
+                    await self.load()
+                await amqpconnector.receive(self._process)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                await logger.exception({'module': name, 'msg': 'Device registry listener failed'})
+            rebind = True
+            await asyncio.sleep(retry)
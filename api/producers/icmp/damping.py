@@ -0,0 +1,58 @@
+from collections import deque
+
+
+class FlapDamper:
+    # N-of-M loss window with hysteresis per device: device goes OFFLINE after `down` losses
+    # within last `window` probes and returns ONLINE only after `up` consecutive replies.
+    # Offline devices are probed with exponential back-off up to `backoff_max` seconds.
+    # Defaults (1 of 1, no back-off) reproduce undamped behaviour
+    def __init__(self, window: int = 1, down: int = 1, up: int = 1, backoff_base: float = 0, backoff_max: float = 0):
+        self.__window = window
+        self.__down = min(down, window)
+        self.__up = up
+        self.__backoff_base = backoff_base
+        self.__backoff_max = backoff_max
+        self.__hosts = {}
+
+    class HostState:
+        __slots__ = ('results', 'status', 'successes', 'backoff', 'next_probe')
+
+        def __init__(self, window):
+            self.results = deque(maxlen=window)
+            self.status = None
+            self.successes = 0
+            self.backoff = 0
+            self.next_probe = 0
+
+    def due(self, key, now: float) -> bool:
+        host = self.__hosts.get(key)
+        return host is None or now >= host.next_probe
+
+    def status(self, key):
+        host = self.__hosts.get(key)
+        return None if host is None else host.status
+
+    def update(self, key, online: bool, now: float) -> str:
+        host = self.__hosts.get(key)
+        if host is None:
+            host = self.__hosts[key] = self.HostState(self.__window)
+        host.results.append(online)
+        host.successes = host.successes + 1 if online else 0
+        if host.status is None:
+            host.status = 'ONLINE' if online else 'OFFLINE'
+        elif host.status == 'ONLINE' and host.results.count(False) >= self.__down:
+            host.status = 'OFFLINE'
+        elif host.status == 'OFFLINE' and host.successes >= self.__up:
+            host.status = 'ONLINE'
+            host.results.clear()
+        # back-off only while device is offline and keeps failing
+        if host.status == 'OFFLINE' and not online:
+            host.backoff = min(max(host.backoff*2, self.__backoff_base), self.__backoff_max)
+        else:
+            host.backoff = 0
+        host.next_probe = now + host.backoff
+        return host.status
+
+    def prune(self, keys):
+        for key in [k for k in self.__hosts if k not in keys]:
+            del self.__hosts[key]
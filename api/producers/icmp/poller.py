@@ -15,14 +15,33 @@ from setproctitle import setproctitle
 import sys
 import uvloop
 
+from integration.api.producers.devices import DeviceRegistry
+from integration.api.producers.icmp.damping import FlapDamper
+from integration.api.producers.icmp.sweeper import ICMPSweeper
+
 
 class AsyncPingPoller:
-    def __init__(self):
+    def __init__(self, sweep: bool = False, changes_only: bool = False, refresh_interval: int = 600, damping: dict = None, devices_ttl: int = 3600):
         self.__amqpconnector = None
         self.__dbconnector_is = None
         self.__eventloop = None
         self.__eventsignal = False
         self.__logger = None
+        self.__registry = None
+        self.__devices_ttl = devices_ttl
+        # single raw socket sweeper instead of one aioping socket per device
+        self.__sweep = sweep
+        self.__sweeper = None
+        # last published network status by terId, only transitions are published
+        # and full state is republished each refresh interval
+        self.__changes_only = changes_only
+        self.__refresh_interval = refresh_interval
+        self.__refresh_ts = 0
+        self.__refresh = True
+        self.__states = {}
+        self.__counters = {'emitted': 0, 'suppressed': 0}
+        # N-of-M loss window and back-off for offline devices, back-off starts from polling interval
+        self.__damper = FlapDamper(**{'backoff_base': cs.IS_RDBS_POLLING_INTERVAL, **(damping or {})})
         self.name = 'PingPoller'
 
     @property
@@ -161,6 +180,10 @@ class AsyncPingPoller:
             connections_tasks.append(AsyncAMQP(cs.IS_AMQP_USER, cs.IS_AMQP_PASSWORD, cs.IS_AMQP_HOST, exchange_name='integration', exchange_type='topic').connect())
             connections_tasks.append(AsyncDBPool(cs.IS_SQL_CNX).connect())
             self.__amqpconnector, self.__dbconnector_is = await asyncio.gather(*connections_tasks)
+            self.__registry = await DeviceRegistry(self.__dbconnector_is, self.__devices_ttl).load()
+            asyncio.ensure_future(self.__registry.listen(self.__amqpconnector, self.name, self.__logger))
+            if self.__sweep:
+                self.__sweeper = ICMPSweeper().open()
         except Exception as e:
             await self.__logger.exception({'module': self.name})
             raise e
@@ -169,30 +192,61 @@ class AsyncPingPoller:
             await self.__logger.info({'module': self.name, 'msg': 'Started'})
             return self
 
-    async def _process(self, device):
+    async def _publish(self, device, value, ts):
+        if self.__changes_only and not self.__refresh and self.__states.get(device['terId']) == value:
+            self.__counters['suppressed'] += 1
+            return
         network_status = self.NetworkStatus()
         network_status.device_id = device['terId']
         network_status.device_type = device['terType']
         network_status.device_ip = device['terIp']
         network_status.ampp_id = device['amppId']
         network_status.ampp_type = device['amppType']
-        network_status.ts = datetime.now().timestamp()
+        network_status.ts = ts
+        network_status.value = value
+        await self.__amqpconnector.send(network_status.data, persistent=True, keys=['status.online'], priority=7)
+        self.__states[device['terId']] = value
+        self.__counters['emitted'] += 1
+
+    async def _process(self, device):
         try:
             await aioping.ping(device['terIp'], timeout=cs.IS_SNMP_TIMEOUT)
-            network_status.value = 'ONLINE'
-        except (TimeoutError, asyncio.TimeoutError):
-            network_status.value = 'OFFLINE'
-        finally:
-            await self.__amqpconnector.send(network_status.data, persistent=True, keys=['status.online'], priority=7)
+            return True
+        except (TimeoutError, asyncio.TimeoutError, OSError):
+            return False
+
+    async def _sweep(self, devices):
+        results = await self.__sweeper.sweep([d['terIp'] for d in devices], cs.IS_SNMP_TIMEOUT)
+        return [not results.get(d['terIp']) is None for d in devices]
 
     async def _dispatch(self):
         while not self.eventsignal:
             await self.__dbconnector_is.callproc('is_processes_upd', rows=0, values=[self.name, 1, datetime.now()])
             try:
-                devices = await self.__dbconnector_is.callproc('is_device_get', rows=-1, values=[None, None, None, None, None])
+                await self.__registry.refresh()
+                devices = self.__registry.devices
+                self.__refresh = datetime.now().timestamp() - self.__refresh_ts >= self.__refresh_interval
+                if self.__refresh:
+                    self.__refresh_ts = datetime.now().timestamp()
+                    self.__states = {d['terId']: self.__states[d['terId']] for d in devices if d['terId'] in self.__states}
+                    self.__damper.prune([d['terId'] for d in devices])
+                    await self.__logger.info({'module': self.name, 'counters': self.__counters})
+                    # RTT and loss over sweeper window per device
+                    if not self.__sweeper is None:
+                        self.__sweeper.prune({d['terIp'] for d in devices})
+                        await self.__logger.info({'module': self.name, 'hosts': {d['terId']: self.__sweeper.stats(d['terIp']) for d in devices}})
+                ts = datetime.now().timestamp()
+                # devices in back-off are skipped and keep their damped status
+                probed = [d for d in devices if self.__damper.due(d['terId'], ts)]
+                if not self.__sweeper is None:
+                    results = await self._sweep(probed)
+                else:
+                    results = await asyncio.gather(*[self._process(d) for d in probed])
+                for d, online in zip(probed, results):
+                    self.__damper.update(d['terId'], online, ts)
                 tasks = []
                 for d in devices:
-                    tasks.append(self._process(d))
+                    tasks.append(self._publish(d, self.__damper.status(d['terId']), ts))
                 await asyncio.gather(*tasks)
                 await asyncio.sleep(cs.IS_RDBS_POLLING_INTERVAL)
             except asyncio.CancelledError:
@@ -211,6 +265,8 @@ class AsyncPingPoller:
     async def _signal_handler(self, signal):
         # stop while loop coroutine
         self.eventsignal = True
+        if not self.__sweeper is None:
+            self.__sweeper.close()
         await self.__dbconnector_is.callproc('is_processes_upd', rows=0, values=[self.name, 0, datetime.now()])
         closing_tasks = []
         closing_tasks.append(self.__dbconnector_is.disconnect())
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import socket
+import struct
+from collections import deque
+
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack(f'!{len(data)//2}H', data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+class ICMPSweeper:
+    # one shared ICMP socket for the whole sweep: echo requests are sent in one burst
+    # and replies are matched back to hosts by identifier/sequence
+    def __init__(self, window: int = 10, payload: bytes = b'integration-icmp-sweeper-payload'):
+        self.__socket = None
+        self.__raw = True
+        self.__ident = os.getpid() & 0xffff
+        self.__seq = 0
+        self.__payload = payload
+        self.__pending = {}
+        self.__results = {}
+        self.__done = None
+        self.__loop = None
+        # per-host history is bounded by window size
+        self.__window = window
+        self.__history = {}
+
+    def open(self):
+        self.__loop = asyncio.get_event_loop()
+        try:
+            self.__socket = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+            self.__raw = True
+        except PermissionError:
+            # unprivileged ICMP socket (net.ipv4.ping_group_range), kernel owns identifier
+            self.__socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+            self.__raw = False
+        self.__socket.setblocking(False)
+        self.__done = asyncio.Event()
+        self.__loop.add_reader(self.__socket.fileno(), self._on_readable)
+        return self
+
+    def close(self):
+        if not self.__socket is None:
+            self.__loop.remove_reader(self.__socket.fileno())
+            self.__socket.close()
+            self.__socket = None
+
+    def _next_seq(self) -> int:
+        self.__seq = (self.__seq + 1) & 0xffff
+        return self.__seq
+
+    def _packet(self, seq: int) -> bytes:
+        header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, self.__ident, seq)
+        checksum = _checksum(header + self.__payload)
+        return struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, checksum, self.__ident, seq) + self.__payload
+
+    def _on_readable(self):
+        while True:
+            try:
+                data, addr = self.__socket.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            if self.__raw:
+                # raw socket delivers IP header
+                data = data[(data[0] & 0x0f)*4:]
+            if len(data) < 8:
+                continue
+            icmp_type, _, _, ident, seq = struct.unpack('!BBHHH', data[:8])
+            if icmp_type != ICMP_ECHO_REPLY or (self.__raw and ident != self.__ident):
+                continue
+            pending = self.__pending.get(seq)
+            if pending is None or pending[0] != addr[0]:
+                continue
+            del self.__pending[seq]
+            self.__results[pending[0]] = self.__loop.time() - pending[1]
+            if not self.__pending:
+                self.__done.set()
+
+    async def sweep(self, hosts: list, timeout: float) -> dict:
+        # returns RTT in seconds per host, None for lost ones
+        self.__results = dict.fromkeys(hosts)
+        self.__pending.clear()
+        self.__done.clear()
+        for ip in self.__results:
+            seq = self._next_seq()
+            self.__pending[seq] = (ip, self.__loop.time())
+            packet = self._packet(seq)
+            for _ in range(3):
+                try:
+                    self.__socket.sendto(packet, (ip, 0))
+                    break
+                except (BlockingIOError, InterruptedError):
+                    # socket buffer is full, let the loop drain replies
+                    await asyncio.sleep(0)
+                except OSError:
+                    # unreachable network or invalid address
+                    break
+        if self.__pending:
+            try:
+                await asyncio.wait_for(self.__done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self.__pending.clear()
+        for ip, rtt in self.__results.items():
+            self.__history.setdefault(ip, deque(maxlen=self.__window)).append(rtt)
+        return self.__results
+
+    # forget hosts that left inventory, hosts skipped by one sweep keep their history
+    def prune(self, hosts: list):
+        for ip in [ip for ip in self.__history if not ip in hosts]:
+            del self.__history[ip]
+
+    def stats(self, ip: str) -> dict:
+        history = self.__history.get(ip, ())
+        rtts = [r for r in history if not r is None]
+        return {'sent': len(history),
+                'received': len(rtts),
+                'loss': 1 - len(rtts)/len(history) if history else None,
+                'rtt_last': history[-1] if history else None,
+                'rtt_avg': sum(rtts)/len(rtts) if rtts else None}
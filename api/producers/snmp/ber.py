@@ -0,0 +1,121 @@
+# minimal BER codec of SNMPv2c messages used by capture replay
+INTEGER = 0x02
+OCTET_STRING = 0x04
+NULL = 0x05
+OBJECT_IDENTIFIER = 0x06
+SEQUENCE = 0x30
+TIMETICKS = 0x43
+NO_SUCH_OBJECT = 0x80
+GET_REQUEST = 0xa0
+GET_NEXT_REQUEST = 0xa1
+GET_RESPONSE = 0xa2
+GET_BULK_REQUEST = 0xa5
+SNMPV2_TRAP = 0xa7
+
+SYS_UPTIME_OID = '.1.3.6.1.2.1.1.3.0'
+SNMP_TRAP_OID = '.1.3.6.1.6.3.1.1.4.1.0'
+
+# error-status
+GEN_ERR = 5
+
+
+def _length(n: int) -> bytes:
+    if n < 0x80:
+        return bytes([n])
+    encoded = n.to_bytes((n.bit_length() + 7)//8, 'big')
+    return bytes([0x80 | len(encoded)]) + encoded
+
+
+def tlv(tag: int, value: bytes) -> bytes:
+    return bytes([tag]) + _length(len(value)) + value
+
+
+def integer(value: int, tag: int = INTEGER) -> bytes:
+    return tlv(tag, value.to_bytes(((value if value >= 0 else ~value).bit_length() + 8)//8, 'big', signed=True))
+
+
+def unsigned(value: int, tag: int) -> bytes:
+    return tlv(tag, value.to_bytes(max(1, (value.bit_length() + 8)//8), 'big'))
+
+
+def octet_string(value) -> bytes:
+    return tlv(OCTET_STRING, value.encode() if isinstance(value, str) else value)
+
+
+def oid(value: str) -> bytes:
+    arcs = [int(a) for a in value.strip('.').split('.')]
+    encoded = bytearray([40*arcs[0] + arcs[1]])
+    for arc in arcs[2:]:
+        chunk = [arc & 0x7f]
+        arc >>= 7
+        while arc:
+            chunk.append(0x80 | (arc & 0x7f))
+            arc >>= 7
+        encoded.extend(reversed(chunk))
+    return tlv(OBJECT_IDENTIFIER, bytes(encoded))
+
+
+def sequence(*items: bytes, tag: int = SEQUENCE) -> bytes:
+    return tlv(tag, b''.join(items))
+
+
+def value(v) -> bytes:
+    if v is None:
+        return tlv(NO_SUCH_OBJECT, b'')
+    if isinstance(v, int):
+        return integer(v)
+    return octet_string(v)
+
+
+# varbinds are (oid, encoded value) pairs
+def message(community: str, pdu_tag: int, request_id: int, varbinds: list, error_status: int = 0, error_index: int = 0) -> bytes:
+    return sequence(integer(1),
+                    octet_string(community),
+                    sequence(integer(request_id), integer(error_status), integer(error_index),
+                             sequence(*[sequence(oid(o), v) for o, v in varbinds]),
+                             tag=pdu_tag))
+
+
+def trap(community: str, request_id: int, uptime: int, trap_oid: str, varbinds: list) -> bytes:
+    return message(community, SNMPV2_TRAP, request_id,
+                   [(SYS_UPTIME_OID, unsigned(uptime, TIMETICKS)), (SNMP_TRAP_OID, oid(trap_oid))] + varbinds)
+
+
+def decode_tlv(data: bytes, pos: int = 0):
+    tag = data[pos]
+    n = data[pos + 1]
+    pos += 2
+    if n & 0x80:
+        size = n & 0x7f
+        n = int.from_bytes(data[pos:pos + size], 'big')
+        pos += size
+    return tag, data[pos:pos + n], pos + n
+
+
+def decode_items(data: bytes) -> list:
+    items = []
+    pos = 0
+    while pos < len(data):
+        tag, v, pos = decode_tlv(data, pos)
+        items.append((tag, v))
+    return items
+
+
+def decode_oid(data: bytes) -> str:
+    arcs = [data[0]//40, data[0] % 40]
+    arc = 0
+    for b in data[1:]:
+        arc = (arc << 7) | (b & 0x7f)
+        if not b & 0x80:
+            arcs.append(arc)
+            arc = 0
+    return '.' + '.'.join(str(a) for a in arcs)
+
+
+def decode_request(data: bytes):
+    # returns (community, pdu tag, request id, [oid, ...])
+    _, body, _ = decode_tlv(data)
+    (_, _), (_, community), (pdu_tag, pdu) = decode_items(body)
+    request_id, _, _, (_, varbinds) = decode_items(pdu)
+    oids = [decode_oid(decode_items(vb)[0][1]) for _, vb in decode_items(varbinds)]
+    return community.decode(), pdu_tag, int.from_bytes(request_id[1], 'big', signed=True), oids
@@ -0,0 +1,33 @@
+import json
+from datetime import datetime
+
+
+class CaptureWriter:
+    # append-only JSONL capture of raw SNMP varbinds: one line per trap or poll result
+    # {"ts": <unix time>, "kind": "trap"|"poll", "ip": <agent address>, "oid": <oid>, "value": <int or str>}
+    def __init__(self, path: str):
+        self.__path = path
+        self.__file = None
+
+    def open(self):
+        # line buffered, capture survives process kill
+        self.__file = open(self.__path, 'a', buffering=1, encoding='utf-8')
+        return self
+
+    def close(self):
+        if not self.__file is None:
+            self.__file.close()
+            self.__file = None
+
+    def write(self, kind: str, ip: str, oid: str, value):
+        if isinstance(value, bytes):
+            value = value.decode('utf-8', errors='replace')
+        self.__file.write(json.dumps({'ts': datetime.now().timestamp(), 'kind': kind, 'ip': ip, 'oid': oid, 'value': value},
+                                     separators=(',', ':')) + '\n')
+
+
+def read_capture(path: str):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,50 @@
+from collections import OrderedDict
+
+
+class TrapDeduplicator:
+    # drops trap when same value of same (device, OID) was accepted less than window seconds ago.
+    # Window is set per codename, 0 disables deduplication for codename.
+    # With sliding windows every dropped copy extends the window, so chattering state
+    # is coalesced into one event until it stays quiet for window seconds.
+    # Recent keys are kept in LRU bounded by size
+    def __init__(self, window: float = 0, windows: dict = None, sliding: bool = False, size: int = 4096):
+        self.__window = window
+        self.__windows = windows or {}
+        self.__sliding = sliding
+        self.__size = size
+        self.__recent = OrderedDict()
+        self.__duplicates = {}
+        self.__passed = 0
+
+    def _window(self, codename: str) -> float:
+        return self.__windows.get(codename, self.__window)
+
+    def accept(self, host: str, mib, value, now: float) -> bool:
+        window = self._window(mib.codename)
+        if not window:
+            self.__passed += 1
+            return True
+        key = (host, mib.oid)
+        recent = self.__recent.get(key)
+        if not recent is None and recent[0] == value and now - recent[1] < window:
+            if self.__sliding:
+                self.__recent[key] = (value, now)
+            self.__recent.move_to_end(key)
+            self.__duplicates[mib.codename] = self.__duplicates.get(mib.codename, 0) + 1
+            return False
+        self.__recent[key] = (value, now)
+        self.__recent.move_to_end(key)
+        if len(self.__recent) > self.__size:
+            self.__recent.popitem(last=False)
+        self.__passed += 1
+        return True
+
+    # counters since previous call
+    def metrics(self) -> dict:
+        metrics = {'passed': self.__passed,
+                   'duplicates': sum(self.__duplicates.values()),
+                   'by_codename': self.__duplicates,
+                   'keys': len(self.__recent)}
+        self.__passed = 0
+        self.__duplicates = {}
+        return metrics
@@ -1,16 +1,23 @@
 import datetime
 from dataclasses import dataclass
 from enum import Enum
+from typing import NamedTuple
+from uuid import uuid4
 
-from integration.producers.snmp.statuses import *
+from integration.api.producers.snmp.statuses import *
+
+DEFAULT_UID = "00000000-0000-0000-0000-000000000000"
 
 
 @dataclass
 class SNMPObject:
 
-    def __init__(self, codename_value: str, oid_value: str, status_map: object = None, forced_value: str = None):
+    def __init__(self, codename_value: str, oid_value: str, status_map: object = None, forced_value: str = None, interval: int = None):
         self.codename = codename_value
         self.oid = oid_value
+        # polling interval in seconds, None for default polling interval
+        self.interval = interval
+        self.status_map = status_map
         self.__snmpvalue: int = None
         self.__device_id: int = None
         self.__device_address: int = None
@@ -18,6 +25,7 @@ class SNMPObject:
         self.__device_type: int = None
         self.__device_area: int = None
         self.__statusname = status_map
+        self.__table = enum_tables.get(status_map)
         self.__statusforced = forced_value
         self.__snmpvalue: int = -1
         self.__ampp_id: int = None
@@ -25,8 +33,8 @@ class SNMPObject:
         self.__ts = datetime
         self.__keyword: str = None
         # default value
-        self.__act_uid: str = "00000000-0000-0000-0000-000000000000"
-        self.__tra_uid: str = "00000000-0000-0000-0000-000000000000"
+        self.__act_uid: str = DEFAULT_UID
+        self.__tra_uid: str = DEFAULT_UID
 
     @property
     def device_id(self):
@@ -113,17 +121,32 @@ class SNMPObject:
 
     @snmpvalue.getter
     def snmpvalue(self):
-        if self.__statusname:
-            return self.__statusname(self.__snmpvalue).name
+        return self.decode(self.__snmpvalue)
+
+    def decode(self, value):
+        # raw value of varbind to published value, non integer values are treated as not set
+        if not isinstance(value, int):
+            value = -1
+        if self.__table:
+            return self.__table.decode(value)
+        elif self.__statusname:
+            return self.__statusname(value).name
         elif self.__statusforced:
             return self.__statusforced
         elif not self.__statusname and not self.__statusforced:
             if self.codename in ["12VBoard", "24VBoard"]:
-                return self.__snmpvalue/10
+                return value/10
             elif self.codename == "24ABoard":
-                return self.__snmpvalue/100
+                return value/100
             elif self.codename in ['IOBoard1.Temperature', 'IOBoard1.Temperature']:
-                return self.__snmpvalue
+                return value
+
+    # new reading of this object for device, shared object itself is not modified
+    def read(self, device: dict, value, tra_uid: str = DEFAULT_UID):
+        return self.reading(device, self.decode(value), tra_uid)
+
+    def reading(self, device: dict, value, tra_uid: str = DEFAULT_UID):
+        return SNMPReading(self, device, value, str(uuid4()), tra_uid, datetime.datetime.now().timestamp())
 
     @property
     def ts(self):
@@ -193,6 +216,36 @@ class SNMPObject:
         return self
 
 
+class SNMPReading(NamedTuple):
+    # immutable reading of SNMP object, created per varbind
+    mib: SNMPObject
+    device: dict
+    value: object
+    act_uid: str
+    tra_uid: str
+    ts: float
+
+    @property
+    def codename(self):
+        return self.mib.codename
+
+    @property
+    def data(self):
+        device = self.device
+        return {'device_id': device['terId'],
+                'device_address': device['terAddress'],
+                'device_type': device['terType'],
+                'device_area': device['areaId'],
+                'codename': self.mib.codename,
+                'value': self.value,
+                'act_uid': self.act_uid,
+                'tra_uid': self.tra_uid,
+                'ts': self.ts,
+                'ampp_id': device['amppId'],
+                'ampp_type': device['amppType'],
+                'device_ip': device['terIp']}
+
+
 receiving_mibs = [
     SNMPObject('General', '.1.3.6.1.4.1.40383.1.2.2.90', forced_value='OUT_OF_SERVICE').instance,
     SNMPObject('General', '.1.3.6.1.4.1.40383.1.2.2.29', forced_value='REBOOTING').instance,
@@ -228,9 +281,9 @@ receiving_mibs = [
 
 polling_mibs = [
     SNMPObject('General', '.1.3.6.1.4.1.40383.1.2.3.0', status_map=General).instance,
-    SNMPObject('Heater', '.1.3.6.1.4.1.40383.1.2.2.42', status_map=Heater).instance,
-    SNMPObject('FanIn', '.1.3.6.1.4.1.40383.1.2.2.40', status_map=FanIn).instance,
-    SNMPObject('FanOut', '.1.3.6.1.4.1.40383.1.2.2.41', status_map=FanOut).instance,
+    SNMPObject('Heater', '.1.3.6.1.4.1.40383.1.2.2.42', status_map=Heater, interval=300).instance,
+    SNMPObject('FanIn', '.1.3.6.1.4.1.40383.1.2.2.40', status_map=FanIn, interval=300).instance,
+    SNMPObject('FanOut', '.1.3.6.1.4.1.40383.1.2.2.41', status_map=FanOut, interval=300).instance,
     SNMPObject('UpperDoor', '.1.3.6.1.4.1.40383.1.2.2.21', status_map=UppperDoor).instance,
     SNMPObject('VoIP', '.1.3.6.1.4.1.40383.1.2.1.60001.1', status_map=VoIP).instance,
     SNMPObject('Roboticket1', '.1.3.6.1.4.1.40383.1.2.1.10001.2', status_map=Roboticket).instance,
@@ -239,8 +292,8 @@ polling_mibs = [
     SNMPObject('IOBoards', '.1.3.6.1.4.1.40383.1.2.1.50001.1', status_map=IOBoards).instance,
     SNMPObject('PaperDevice1', '.1.3.6.1.4.1.40383.1.2.3.2', status_map=PaperDevice).instance,
     SNMPObject('PaperDevice2', '.1.3.6.1.4.1.40383.1.2.3.3', status_map=PaperDevice).instance,
-    SNMPObject('IOBoard1.Temperature', '.1.3.6.1.4.1.40383.1.2.2.64').instance,
-    SNMPObject('IOBoard2.Temperature', '.1.3.6.1.4.1.40383.1.2.2.74').instance,
+    SNMPObject('IOBoard1.Temperature', '.1.3.6.1.4.1.40383.1.2.2.64', interval=300).instance,
+    SNMPObject('IOBoard2.Temperature', '.1.3.6.1.4.1.40383.1.2.2.74', interval=300).instance,
     SNMPObject('VoIP', '.1.3.6.1.4.1.40383.1.2.1.60001.1', status_map=VoIP).instance,
     SNMPObject('TicketReader1', '.1.3.6.1.4.1.40383.1.2.1.20001.2', status_map=TicketReader).instance,
     SNMPObject('TicketReader2', '.1.3.6.1.4.1.40383.1.2.1.20005.2', status_map=TicketReader).instance,
@@ -267,7 +320,160 @@ polling_mibs = [
     SNMPObject('BarrierLoop1Status', '.1.3.6.1.4.1.40383.1.2.2.18', status_map=Loop).instance,
     SNMPObject('BarrierLoop2Status', '.1.3.6.1.4.1.40383.1.2.2.19', status_map=Loop).instance,
     SNMPObject('BarrierLoop3Status', '.1.3.6.1.4.1.40383.1.2.2.20', status_map=Loop).instance,
-    SNMPObject('12VBoard', '.1.3.6.1.4.1.40383.1.2.2.69').instance,
-    SNMPObject('24VBoard', '.1.3.6.1.4.1.40383.1.2.2.70').instance,
-    SNMPObject('24ABoard', '.1.3.6.1.4.1.40383.1.2.2.71').instance,
+    SNMPObject('12VBoard', '.1.3.6.1.4.1.40383.1.2.2.69', interval=300).instance,
+    SNMPObject('24VBoard', '.1.3.6.1.4.1.40383.1.2.2.70', interval=300).instance,
+    SNMPObject('24ABoard', '.1.3.6.1.4.1.40383.1.2.2.71', interval=300).instance,
 ]
+
+# OID lookup tables, first definition wins for duplicated OIDs
+polling_index = {m.oid: m for m in reversed(polling_mibs)}
+receiving_index = {m.oid: m for m in reversed(receiving_mibs)}
+
+
+def decode_batch(index: dict, varbinds: list):
+    # decodes all varbinds of response in one pass, unknown OIDs are skipped,
+    # codes that are not in status map are returned separately as (oid, value)
+    decoded = []
+    invalid = []
+    for varbind in varbinds:
+        mib = index.get(varbind.oid)
+        if not mib is None:
+            try:
+                decoded.append((mib, mib.decode(varbind.value)))
+            except ValueError:
+                invalid.append((varbind.oid, varbind.value))
+    return decoded, invalid
+
+
+class Route(NamedTuple):
+    keys: tuple
+    priority: int
+    # keys are suffixed with `entry`/`exit` by device type, other device types are not routed
+    by_type: bool = False
+    # keys by decoded value, values that are not listed are not routed
+    by_value: dict = None
+
+
+DEVICE_TYPE_SUFFIX = {1: 'entry', 2: 'exit'}
+
+
+def route_keys(route: Route, value, device_type: int) -> list:
+    keys = route.keys
+    if not route.by_value is None:
+        keys = route.by_value.get(value)
+        if keys is None:
+            return None
+    if route.by_type:
+        suffix = DEVICE_TYPE_SUFFIX.get(device_type)
+        if suffix is None:
+            return None
+        return [f'{k}.{suffix}' for k in keys]
+    return list(keys)
+
+
+# Roboticket1/2, TicketPrinter1 and CoinsHopper1 are not listed: they never matched
+# former if/elif chain (codename typos) and are published as `status.others`
+polling_routes = {
+    'BarrierLoop1Status': Route(('status.loop1',), 6),
+    'BarrierLoop2Status': Route(('status.loop2',), 6),
+    'BarrierStatus': Route(('status.barrier',), 8),
+    'AlmostOutOfPaper': Route(('status.paper', 'event.paper'), 7),
+    'PaperDevice1': Route(('status.paper', 'event.paper'), 7),
+    'PaperDevice2': Route(('status.paper', 'event.paper'), 7),
+    'General': Route(('status.general', 'event.general'), 8),
+    'Heater': Route(('status.heater',), 1),
+    'FanIn': Route(('status.fan',), 1),
+    'FanOut': Route(('status.fan',), 1),
+    'UpperDoor': Route(('status.door', 'event.door'), 8),
+    'MiddleDoor': Route(('status.door', 'event.door'), 8),
+    'TicketPrinter2': Route(('status.printer', 'event.ticketdevice'), 8),
+    'IOBoards': Route(('status.ioboards',), 8),
+    'IOBoard1.Temperature': Route(('status.temperature',), 2),
+    'IOBoard2.Temperature': Route(('status.temperature',), 2),
+    'VoIP': Route(('status.voip', 'event.voip'), 7),
+    'TicketReader1': Route(('status.reader', 'event.ticketdevice'), 7),
+    'TicketReader2': Route(('status.reader', 'event.ticketdevice'), 7),
+    'Coinbox': Route(('status.coinbox', 'event.coinbox'), 1),
+    'CubeHopper': Route(('status.coins',), 1),
+    'CoinsReader': Route(('status.coins',), 1),
+    'CoinsHopper2': Route(('status.coins',), 1),
+    'CoinsHopper3': Route(('status.coins',), 1),
+    'CoinBoxTriggered': Route(('status.coins',), 1),
+    'UPS': Route(('status.ups', 'event.ups'), 5),
+    'IOCCtalk': Route(('status.fiscal', 'event.fiscal'), 8),
+    'FiscalPrinterStatus': Route(('status.fiscal', 'event.fiscal'), 8),
+    'FiscalPrinterBD': Route(('status.fiscal', 'event.fiscal'), 8),
+    '12VBoard': Route(('status.boards',), 3),
+    '24VBoard': Route(('status.boards',), 3),
+    '24ABoard': Route(('status.boards',), 3),
+    'NotesEscrow': Route(('status.payout', 'event.payout'), 7),
+    'NotesReader': Route(('status.payout', 'event.payout'), 7),
+}
+polling_default_route = Route(('status.others',), 1)
+
+# traps without route are not published
+receiving_routes = {
+    'BarrierLoop1Status': Route(('status.loop1',), 10, by_type=True, by_value={'OCCUPIED': ('status.loop1',), 'FREE': ('status.loop1',)}),
+    'BarrierLoop2Status': Route(('status.loop2',), 10, by_type=True),
+    'BarrierLoop1Reverse': Route(('status.reverse',), 10, by_type=True),
+    'BarrierStatus': Route(('status.barrier',), 10, by_type=True),
+    'PaymentType': Route(('status.payment.type',), 10),
+    'PaymentAmount': Route(('status.payment.amount',), 10),
+    'PaymentCardType': Route(('status.payment.cardtype',), 10),
+    'PaymentStatus': Route((), 10, by_value={'ZONE_PAYMENT': ('status.payment.proceeding',),
+                                             'FINISHED_WITH_SUCCESS': ('status.payment.finished',),
+                                             'FINISHED_WITH_ISSUES': ('status.payment.finished',),
+                                             'PAYMENT_CANCELLED': ('status.payment.cancelled',)}),
+    'General': Route(('status.general',), 9),
+    'UpperDoor': Route(('status.door',), 9),
+    'MiddleDoor': Route(('status.door',), 9),
+    'IOBoard2.Temperature': Route(('status.temperature',), 9),
+    'IOBoard3.Temperature': Route(('status.temperature',), 9),
+    'Roboticket1': Route(('status.tickets', 'event.tickets'), 9),
+    'TicketPrinter1': Route(('status.tickets', 'event.tickets'), 9),
+    'FiscalPrinterIssues': Route(('status.fiscal', 'event.fiscal'), 10),
+    'FiscalPrinterBD': Route(('status.fiscal', 'event.fiscal'), 10),
+    'NotesReader': Route(('status.payout', 'event.payout'), 10),
+    'CoinsHopper1': Route(('status.coinhopper',), 3),
+    'CoinsHopper2': Route(('status.coinhopper',), 3),
+    'CoinsHopper3': Route(('status.coinhopper',), 3),
+    'Coinbox': Route(('status.coinbox', 'event.coinbox'), 3),
+}
+
+# (codename, value) of traps that open new transaction
+transaction_triggers = {('BarrierLoop1Status', 'OCCUPIED'),
+                        ('PaymentStatus', 'FINISHED_WITH_SUCCESS'),
+                        ('PaymentStatus', 'FINISHED_WITH_ISSUES')}
+
+# traps of these objects are never dropped by receiver queue
+critical_codenames = {'BarrierLoop1Status', 'BarrierLoop2Status', 'BarrierLoop1Reverse', 'BarrierStatus',
+                      'PaymentType', 'PaymentAmount', 'PaymentCardType', 'PaymentStatus'}
+
+
+if __name__ == '__main__':
+    # micro-benchmark of per-reading Enum decoding against compiled tables
+    import timeit
+    from types import SimpleNamespace
+
+    varbinds = [SimpleNamespace(oid=m.oid, value=v) for m in polling_mibs for v in (0, 1, -1)]
+    valid = [vb for vb in varbinds if not decode_batch(polling_index, [vb])[1]]
+    number = 1000
+
+    def enum_lookup():
+        for vb in valid:
+            status_map = polling_index[vb.oid].status_map
+            if status_map:
+                status_map(vb.value).name
+
+    def table_lookup():
+        for vb in valid:
+            table = enum_tables.get(polling_index[vb.oid].status_map)
+            if table:
+                table.decode(vb.value)
+
+    def batch():
+        decode_batch(polling_index, valid)
+
+    for name, func in (('Enum(value).name', enum_lookup), ('EnumTable.decode', table_lookup), ('decode_batch', batch)):
+        elapsed = timeit.timeit(func, number=number)
+        print(f'{name:<20} {elapsed/number/len(valid)*1e9:8.1f} ns/varbind')
@@ -7,22 +7,63 @@ from utils.asyncsql import AsyncDBPool
 from utils.asyncamqp import AsyncAMQP
 import json
 import configuration.settings as cs
-from .mibs import polling_mibs
+from integration.api.producers.snmp.capture import CaptureWriter
+from .mibs import polling_mibs, polling_index, polling_routes, polling_default_route, decode_batch
+from integration.api.producers.devices import DeviceRegistry
 import signal
-from uuid import uuid4
 import os
 import functools
+import heapq
 from setproctitle import setproctitle
 
 class AsyncSNMPPoller:
 
-    def __init__(self):
+    def __init__(self, devices_ttl: int = 3600, batch: bool = False, varbinds: int = 10,
+                 max_inflight: int = 64, max_per_host: int = None, deadline: float = None, intervals: dict = None,
+                 discovery: bool = False, discovery_subtree: str = '.1.3.6.1.4.1.40383', max_repetitions: int = 25,
+                 discovery_retry: int = 600, port: int = 161, capture: str = None):
         self.__eventloop: object = None
         self.__eventsignal: bool = False
         self.__logger = None
         self.name = 'SNMPPoller'
         self.__amqpconnector_is = None
         self.__dbconnector_is = None
+        self.__registry = None
+        self.__devices_ttl = devices_ttl
+        # list of (device, interval, oids) buckets rebuilt when device registry is reloaded
+        # and heap of (due time, bucket index) entries
+        self.__plan = []
+        self.__plan_version = None
+        # new plan is built in background while current one is polled
+        self.__planning = None
+        self.__schedule = []
+        self.__running = set()
+        # polling interval overrides by codename
+        self.__intervals = intervals or {}
+        # all OIDs of device are requested in one session, `varbinds` OIDs per GET PDU
+        self.__batch = batch
+        self.__varbinds = varbinds
+        # global and per-host caps of concurrent SNMP sessions, in batch mode one session per host is enough
+        self.__max_inflight = max_inflight
+        self.__max_per_host = max_per_host if not max_per_host is None else (1 if batch else 4)
+        self.__inflight = None
+        self.__hosts = {}
+        # device that doesn't finish within deadline is reported late and doesn't delay the cycle
+        self.__deadline = deadline if not deadline is None else cs.IS_RDBS_POLLING_INTERVAL
+        self.__late = []
+        # OIDs of device cut off by deadline in previous cycle, they are requested first in next one
+        self.__unfinished = {}
+        # OIDs implemented by device firmware found by GETBULK walk of enterprise subtree.
+        # Device whose walk failed is polled with full plan and walked again after discovery_retry seconds
+        self.__discovery = discovery
+        self.__discovery_subtree = discovery_subtree
+        self.__max_repetitions = max_repetitions
+        self.__discovery_retry = discovery_retry
+        self.__supported = {}
+        self.__failed = {}
+        # agent port and capture file of raw poll results for offline replay
+        self.__port = port
+        self.__capture = CaptureWriter(capture) if capture else None
 
     @property
     def eventloop(self):
@@ -56,99 +97,232 @@ class AsyncSNMPPoller:
         connections_tasks.append(AsyncAMQP(cs.IS_AMQP_USER, cs.IS_AMQP_PASSWORD, cs.IS_AMQP_HOST, exchange_name='integration', exchange_type='topic').connect())
         connections_tasks.append(AsyncDBPool(cs.IS_SQL_CNX).connect())
         self.__amqpconnector_is, self.__dbconnector_is = await asyncio.gather(*connections_tasks)
+        self.__inflight = asyncio.Semaphore(self.__max_inflight)
+        if not self.__capture is None:
+            self.__capture.open()
+        self.__registry = await DeviceRegistry(self.__dbconnector_is, self.__devices_ttl).load()
+        asyncio.ensure_future(self.__registry.listen(self.__amqpconnector_is, self.name, self.__logger))
         pid = os.getpid()
         await self.__dbconnector_is.callproc('is_processes_ins', rows=0, values=[self.name, 1, os.getpid(), datetime.now()])
         await self.__logger.info({"module": self.name, "info": "Started"})
         return self
 
+    async def _publish(self, device, results):
+        if not self.__capture is None:
+            for res in results:
+                self.__capture.write('poll', device['terIp'], res.oid, res.value)
+        decoded, invalid = decode_batch(polling_index, results)
+        for mib, value in decoded:
+            reading = mib.reading(device, value)
+            route = polling_routes.get(reading.codename, polling_default_route)
+            await self.__amqpconnector_is.send(reading.data, persistent=True, keys=list(route.keys), priority=route.priority)
+        for oid, value in invalid:
+            await self.__logger.error({'module': self.name, 'device': device['terId'], 'oid': oid, 'error': f'unknown status code {value}'})
+
     async def _process(self, device, oid):
         if not device['terId'] == 0:
-            with aiosnmp.Snmp(host=device['terIp'], port=161, community="public", timeout=cs.IS_SNMP_TIMEOUT, retries=cs.IS_SNMP_RETRIES) as snmp:
+            with aiosnmp.Snmp(host=device['terIp'], port=self.__port, community="public", timeout=cs.IS_SNMP_TIMEOUT, retries=cs.IS_SNMP_RETRIES) as snmp:
                 try:
-                    for res in await snmp.get(oid):
-                        snmp_object = next(mib for mib in polling_mibs if mib.oid == res.oid)
-                        snmp_object.ts = datetime.now().timestamp()
-                        snmp_object.device_id = device['terId']
-                        snmp_object.device_address = device['terAddress']
-                        snmp_object.device_type = device['terType']
-                        snmp_object.device_area = device['areaId']
-                        snmp_object.ampp_id = device['amppId']
-                        snmp_object.ampp_type = device['amppType']
-                        snmp_object.device_ip = device['terIp']
-                        snmp_object.snmpvalue = res.value
-                        snmp_object.act_uid = uuid4()
-                        if snmp_object.codename == "BarrierLoop1Status":
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.loop1'], priority=6)
-                        elif snmp_object.codename == "BarrierLoop2Status":
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.loop2'], priority=6)
-                        elif snmp_object.codename == 'BarrierStatus':
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.barrier'], priority=8)
-                        elif snmp_object.codename in ["AlmostOutOfPaper", "PaperDevice1", "PaperDevice2"]:
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.paper', 'event.paper'], priority=7)
-                        elif snmp_object.codename == 'General':
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.general', 'event.general'], priority=8)
-                        elif snmp_object.codename == 'Heater':
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.heater'], priority=1)
-                        elif snmp_object.codename == 'FanIn' or snmp_object.codename == 'FanOut':
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.fan'], priority=1)
-                        elif snmp_object.codename == 'UpperDoor' or snmp_object.codename == 'MiddleDoor':
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.door', 'event.door'], priority=8)
-                        elif (snmp_object.codename == 'RoboTicket1' or snmp_object.codename == 'RoboTicket2' or
-                                snmp_object.codename == 'TicketPtinter1' or snmp_object.codename == 'TicketPrinter2'):
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.printer', 'event.ticketdevice'], priority=8)
-                        elif snmp_object.codename == 'AlmostOutOfPaper':
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.tickets', 'event.tickets'], priority=8)
-                        elif snmp_object.codename == 'IOBoards':
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.ioboards'], priority=8)
-                        elif snmp_object.codename == 'PaperDevice1' or snmp_object.codename == 'PaperDevice2':
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.tickets', 'event.tickets'], priority=5)
-                        elif snmp_object.codename == 'IOBoard1.Temperature' or snmp_object.codename == 'IOBoard2.Temperature':
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.temperature'], priority=2)
-                        elif snmp_object.codename == 'VoIP':
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.voip', 'event.voip'], priority=7)
-                        elif snmp_object.codename in ['TicketReader1', 'TicketReader2']:
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.reader', 'event.ticketdevice'], priority=7)
-                        elif snmp_object.codename == 'Coinbox':
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.coinbox', 'event.coinbox'], priority=1)
-                        elif snmp_object.codename in ['CubeHopper', 'CoinsReader', 'CoinsHoper1', 'CoinsHopper2', 'CoinsHopper3', 'CoinBoxTriggered']:
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.coins'], priority=1)
-                        elif snmp_object.codename == 'UPS':
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.ups', 'event.ups'], priority=5)
-                        elif snmp_object.codename == 'IOCCtalk':
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.fiscal', 'event.fiscal'], priority=8)
-                        elif snmp_object.codename == 'FiscalPrinterStatus':
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.fiscal', 'event.fiscal'], priority=8)
-                        elif snmp_object.codename == 'FiscalPrinterBD':
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.fiscal', 'event.fiscal'], priority=8)
-                        elif snmp_object.codename in ['12VBoard', '24VBoard', '24ABoard']:
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.boards'], priority=3)
-                        elif snmp_object.codename == 'NotesEscrow':
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.payout', 'event.payout'], priority=7)
-                        elif snmp_object.codename == 'NotesReader':
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.payout', 'event.payout'], priority=7)
-                        else:
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.others'], priority=1)
+                    await self._publish(device, await snmp.get(oid))
                 # handle SNMP exceptions
                 except (SnmpErrorNoSuchName, SnmpErrorResourceUnavailable, ValueError, SnmpTimeoutError) as e:
                     await self.__logger.error({'module': self.name, 'error': repr(e)})
                     pass
-                finally:
-                    await asyncio.sleep(0.2)
+
+    async def _process_batch(self, device, oids, unfinished):
+        with aiosnmp.Snmp(host=device['terIp'], port=self.__port, community="public", timeout=cs.IS_SNMP_TIMEOUT, retries=cs.IS_SNMP_RETRIES) as snmp:
+            for i in range(0, len(oids), self.__varbinds):
+                chunk = oids[i:i+self.__varbinds]
+                try:
+                    try:
+                        results = await snmp.get(chunk)
+                    except (SnmpErrorNoSuchName, SnmpErrorResourceUnavailable):
+                        # agent rejected the whole PDU, request OIDs of chunk one by one within same session
+                        results = []
+                        for oid in chunk:
+                            try:
+                                results.extend(await snmp.get(oid))
+                            except (SnmpErrorNoSuchName, SnmpErrorResourceUnavailable) as e:
+                                await self.__logger.error({'module': self.name, 'device': device['terId'], 'oid': oid, 'error': repr(e)})
+                    await self._publish(device, results)
+                except SnmpTimeoutError as e:
+                    # device is not responding, skip remaining chunks
+                    await self.__logger.error({'module': self.name, 'device': device['terId'], 'error': repr(e)})
+                    return
+                except ValueError as e:
+                    # malformed response, next chunk is requested
+                    await self.__logger.error({'module': self.name, 'device': device['terId'], 'error': repr(e)})
+                    continue
+                unfinished.difference_update(chunk)
+
+    async def _slot(self, device, request, *args):
+        host = self.__hosts.get(device['terIp'])
+        if host is None:
+            host = self.__hosts[device['terIp']] = asyncio.Semaphore(self.__max_per_host)
+        # global slot is taken only after host slot, requests queued on busy host don't hold it
+        async with host:
+            async with self.__inflight:
+                return await request(device, *args)
+
+    async def _request(self, device, oid, unfinished):
+        await self._slot(device, self._process, oid)
+        unfinished.discard(oid)
+
+    async def _poll(self, device, oids, deadline):
+        # slow OIDs don't starve trailing ones: what was cut off last time goes first
+        previous = self.__unfinished.pop(device['terId'], set())
+        oids = [oid for oid in oids if oid in previous] + [oid for oid in oids if not oid in previous]
+        unfinished = set(oids)
+        # OIDs of buckets that aren't due this time keep their priority
+        leftover = previous.difference(unfinished)
+        if self.__batch:
+            requests = [self._slot(device, self._process_batch, oids, unfinished)]
+        else:
+            requests = [self._request(device, oid, unfinished) for oid in oids]
+        try:
+            await asyncio.wait_for(asyncio.gather(*requests, return_exceptions=True), deadline)
+        except asyncio.TimeoutError:
+            self.__late.append(device['terId'])
+        if unfinished or leftover:
+            self.__unfinished[device['terId']] = unfinished | leftover
+
+    async def _discover(self, device):
+        with aiosnmp.Snmp(host=device['terIp'], port=self.__port, community="public", timeout=cs.IS_SNMP_TIMEOUT, retries=cs.IS_SNMP_RETRIES) as snmp:
+            try:
+                varbinds = await snmp.bulk_walk(self.__discovery_subtree, max_repetitions=self.__max_repetitions)
+            except (SnmpErrorNoSuchName, SnmpErrorResourceUnavailable, SnmpTimeoutError, ValueError) as e:
+                await self.__logger.error({'module': self.name, 'device': device['terId'], 'discovery': repr(e)})
+                return None
+        if not varbinds:
+            return None
+        # agents may expose scalars with or without instance suffix
+        supported = set()
+        for vb in varbinds:
+            oid = '.' + vb.oid.lstrip('.')
+            supported.add(oid)
+            if oid.endswith('.0'):
+                supported.add(oid[:-2])
+        return supported
+
+    async def _discover_all(self, devices):
+        now = self.eventloop.time()
+        devices = [d for d in devices if not d['terId'] in self.__supported
+                   and now - self.__failed.get(d['terId'], now - self.__discovery_retry) >= self.__discovery_retry]
+        if not devices:
+            return
+        results = await asyncio.gather(*[self._slot(d, self._discover) for d in devices], return_exceptions=True)
+        discovered = {}
+        for d, supported in zip(devices, results):
+            if isinstance(supported, set):
+                self.__supported[d['terId']] = supported
+                self.__failed.pop(d['terId'], None)
+                discovered[d['terId']] = len(supported)
+            else:
+                self.__failed[d['terId']] = self.eventloop.time()
+                discovered[d['terId']] = None
+        await self.__logger.info({'module': self.name, 'discovered': discovered})
+
+    def _retry_due(self):
+        now = self.eventloop.time()
+        return any(now - ts >= self.__discovery_retry for ts in self.__failed.values())
+
+    def _replan(self):
+        # newer registry version supersedes plan that is still being built
+        if not self.__planning is None:
+            self.__planning.cancel()
+        self.__planning = asyncio.ensure_future(self._plan())
+
+    async def _switch(self):
+        planning, self.__planning = self.__planning, None
+        try:
+            self.__plan = planning.result()
+        except Exception:
+            await self.__logger.exception({'module': self.name})
+            # plan is built again on next pass, current one is kept meanwhile
+            self.__plan_version = None
+            return
+        self.__hosts = {}
+        self.__schedule = [(self.eventloop.time(), i) for i in range(len(self.__plan))]
+        heapq.heapify(self.__schedule)
+
+    def _interval(self, mib):
+        return self.__intervals.get(mib.codename, mib.interval or cs.IS_RDBS_POLLING_INTERVAL)
+
+    async def _plan(self):
+        plan = []
+        if self.__discovery:
+            await self._discover_all([d for d in self.__registry.devices if d['terType'] != 0])
+        for d in self.__registry.devices:
+            if d['terType'] != 0:
+                statuses = await self.__dbconnector_is.callproc('is_status_get', rows=-1, values=[d['terId'], None])
+                if not statuses is None:
+                    codenames = [s['stCodename'] for s in statuses]
+                    supported = self.__supported.get(d['terId'])
+                    buckets = {}
+                    for p in polling_mibs:
+                        # OIDs that firmware doesn't implement are not polled
+                        if p.codename in codenames and (supported is None or p.oid in supported):
+                            buckets.setdefault(self._interval(p), []).append(p.oid)
+                    for interval, oids in buckets.items():
+                        plan.append((d, interval, oids))
+        return plan
+
+    def _tick(self, now):
+        # pop due buckets and merge them per device, so device is requested once per tick
+        due = {}
+        while self.__schedule and self.__schedule[0][0] <= now:
+            due_ts, i = heapq.heappop(self.__schedule)
+            device, interval, oids = self.__plan[i]
+            entry = due.setdefault(device['terId'], [device, [], interval])
+            entry[1].extend(oids)
+            entry[2] = min(entry[2], interval)
+            # fixed-rate cadence, missed ticks are skipped
+            next_due = due_ts + interval
+            heapq.heappush(self.__schedule, (next_due if next_due > now else now + interval, i))
+        for device, oids, interval in due.values():
+            task = asyncio.ensure_future(self._poll(device, oids, min(self.__deadline, interval)))
+            self.__running.add(task)
+            task.add_done_callback(self.__running.discard)
 
     async def _dispatch(self):
+        heartbeat = 0
         while not self.eventsignal:
-            devices = await self.__dbconnector_is.callproc('is_device_get', rows=-1, values=[None, None, None, None, None])
-            tasks = []
-            for d in devices:
-                if d['terType'] != 0:
-                    statuses = await self.__dbconnector_is.callproc('is_status_get', rows=-1, values=[d['terId'], None])
-                    if not statuses is None:
-                        oids = [p.oid for p in polling_mibs if p.codename in [s['stCodename'] for s in statuses]]
-                        for oid in oids:
-                            tasks.append(self._process(d, oid))
-            await asyncio.gather(*tasks)
-            await self.__dbconnector_is.callproc('is_processes_upd', rows=0, values=[self.name, 1, datetime.now()])
-            await asyncio.sleep(cs.IS_RDBS_POLLING_INTERVAL)
+            await self.__registry.refresh()
+            if self.__plan_version != self.__registry.version:
+                self.__plan_version = self.__registry.version
+                # discovery is kept across reloads: only devices changed through webservice are walked again
+                # (all of them on configuration reload), removed devices are forgotten, new ones are walked by _plan
+                changed = self.__registry.changed()
+                if None in changed:
+                    self.__supported = {}
+                    self.__failed = {}
+                else:
+                    current = {d['terId'] for d in self.__registry.devices}
+                    self.__supported = {ter_id: supported for ter_id, supported in self.__supported.items()
+                                        if ter_id in current and not ter_id in changed}
+                    self.__failed = {ter_id: ts for ter_id, ts in self.__failed.items()
+                                     if ter_id in current and not ter_id in changed}
+                self._replan()
+            elif self.__discovery and self.__planning is None and self._retry_due():
+                self._replan()
+            if not self.__planning is None and self.__planning.done():
+                await self._switch()
+            now = self.eventloop.time()
+            self._tick(now)
+            if now - heartbeat >= cs.IS_RDBS_POLLING_INTERVAL:
+                heartbeat = now
+                if self.__late:
+                    await self.__logger.warning({'module': self.name, 'late': self.__late})
+                    self.__late = []
+                await self.__dbconnector_is.callproc('is_processes_upd', rows=0, values=[self.name, 1, datetime.now()])
+            # sleep until next bucket is due
+            delay = self.__schedule[0][0] - self.eventloop.time() if self.__schedule else cs.IS_RDBS_POLLING_INTERVAL
+            delay = min(max(delay, 0), cs.IS_RDBS_POLLING_INTERVAL)
+            # or until new plan is ready
+            if self.__planning is None:
+                await asyncio.sleep(delay)
+            else:
+                await asyncio.wait([self.__planning], timeout=delay)
 
     async def _signal_cleanup(self):
         await self.__logger.warning({'module': self.name, 'msg': 'Shutting down'})
@@ -157,6 +331,8 @@ class AsyncSNMPPoller:
         closing_tasks.append(self.__amqpconnector_is.disconnect())
         closing_tasks.append(self.__logger.shutdown())
         await asyncio.gather(*closing_tasks, return_exceptions=True)
+        if not self.__capture is None:
+            self.__capture.close()
 
     async def _signal_handler(self, signal):
         # stop while loop coroutine
@@ -8,6 +8,7 @@ from datetime import datetime
 from uuid import uuid4
 
 import aiosnmp
+from aiosnmp.protocols import SnmpTrapProtocol
 import uvloop
 from setproctitle import setproctitle
 
@@ -16,17 +17,37 @@ from utils.asyncamqp import AsyncAMQP
 from utils.asynclog import AsyncLogger
 from utils.asyncsql import AsyncDBPool
 
-from integration.api.producers.snmp.mibs import receiving_mibs
+from integration.api.producers.devices import DeviceRegistry
+from integration.api.producers.snmp.capture import CaptureWriter
+from integration.api.producers.snmp.dedup import TrapDeduplicator
+from integration.api.producers.snmp.mibs import DEFAULT_UID, critical_codenames, receiving_index, receiving_routes, route_keys, transaction_triggers
+from integration.api.producers.snmp.sharding import reuseport_socket
+from integration.api.producers.snmp.trapqueue import TrapQueue
 
 
 class AsyncSNMPReceiver:
 
-    def __init__(self):
+    def __init__(self, devices_ttl: int = 3600, workers: int = 4, queue_size: int = 1000, metrics_interval: int = 60, shards: int = 1, shard: int = 0, dedup: dict = None, capture: str = None):
         self.__amqpconnector_is = None
         self.__dbconnector_is = None
         self.__eventloop = None
         self.__logger = None
-        self.name = 'SNMPReceiver'
+        self.__registry = None
+        self.__devices_ttl = devices_ttl
+        self.__transactions = {}
+        self.__workers = workers
+        self.__queue_size = queue_size
+        self.__metrics_interval = metrics_interval
+        self.__queue = None
+        self.__locks = {}
+        self.__shards = shards
+        self.__shard = shard
+        self.__received = 0
+        self.__dedup = TrapDeduplicator(**(dedup or {}))
+        # capture file of raw traps for offline replay, one file per shard
+        self.__capture = CaptureWriter(capture if shards == 1 else f'{capture}.{shard}') if capture else None
+        # each shard reports as separate process
+        self.name = 'SNMPReceiver' if shards == 1 else f'SNMPReceiver{shard}'
 
     @property
     def eventloop(self):
@@ -41,108 +62,91 @@ class AsyncSNMPReceiver:
         return self.__eventloop
 
     async def _initialize(self):
-        setproctitle('integration-snmp-receiver')
+        setproctitle('integration-snmp-receiver' if self.__shards == 1 else f'integration-snmp-receiver-{self.__shard}')
         self.__logger = await AsyncLogger().getlogger(cs.IS_LOG)
         await self.__logger.info({'module': self.name, 'msg': 'Starting...'})
         connections_tasks = []
         connections_tasks.append(AsyncAMQP(cs.IS_AMQP_USER, cs.IS_AMQP_PASSWORD, cs.IS_AMQP_HOST, exchange_name='integration', exchange_type='topic').connect())
         connections_tasks.append(AsyncDBPool(cs.IS_SQL_CNX).connect())
         self.__amqpconnector_is, self.__dbconnector_is = await asyncio.gather(*connections_tasks, return_exceptions=True)
+        self.__registry = await DeviceRegistry(self.__dbconnector_is, self.__devices_ttl).load()
+        asyncio.ensure_future(self.__registry.listen(self.__amqpconnector_is, self.name, self.__logger))
+        self.__queue = TrapQueue(self.__queue_size)
+        if not self.__capture is None:
+            self.__capture.open()
         await self.__dbconnector_is.callproc('is_processes_ins', rows=0, values=[self.name, 1, os.getpid(), datetime.now()])
         await self.__logger.info({'module': self.name, 'msg': 'Started'})
         return self
 
+    # trap callback only decodes varbinds and enqueues trap, processing is done by workers
     async def _handler(self, host: str, port: int, message: aiosnmp.SnmpV2TrapMessage):
         try:
             oid = message.data.varbinds[1].value
             val = message.data.varbinds[2].value
+            self.__received += 1
+            if not self.__capture is None:
+                self.__capture.write('trap', host, oid, val)
+            mib = receiving_index.get(oid)
+            # repeated copies of trap are dropped before queueing
+            if not mib is None and self.__dedup.accept(host, mib, val, self.eventloop.time()):
+                await self.__queue.put((host, mib, val), critical=mib.codename in critical_codenames)
+        except Exception as e:
+            await self.__logger.error({'module': self.name, 'exception': repr(e)})
+
+    async def _process(self, host: str, mib, val):
+        try:
             # check if valid device or is it unknown
-            device = await self.__dbconnector_is.callproc('is_device_get', rows=1, values=[None, None, None, None, host])
+            await self.__registry.refresh()
+            device = self.__registry.by_ip(host)
             if not device is None:
-                if oid in [m.oid for m in receiving_mibs]:
-                    snmp_object = next(mib for mib in receiving_mibs if mib.oid == oid)
-                    snmp_object.ts = datetime.now().timestamp()
-                    snmp_object.snmpvalue = val
-                    snmp_object.device_id = device['terId']
-                    snmp_object.device_address = device['terAddress']
-                    snmp_object.device_type = device['terType']
-                    snmp_object.device_area = device['areaId']
-                    snmp_object.ampp_id = device['amppId']
-                    snmp_object.ampp_type = device['amppType']
-                    snmp_object.device_ip = host
-                    snmp_object.act_uid = uuid4()
-                    # triggers that produce transaction event
-                    # partition events to active that must contain transaction uid and passive that don't contain transaction uid
-                    if snmp_object.codename == 'BarrierLoop1Status':
-                        if snmp_object.snmpvalue == 'OCCUPIED':
-                            snmp_object.tra_uid = uuid4()
-                            if snmp_object.device_type == 1:
-                                await self.__amqpconnector_is.send(data=snmp_object.data, persistent=True, keys=['status.loop1.entry'], priority=10)
-                            elif snmp_object.device_type == 2:
-                                await self.__amqpconnector_is.send(data=snmp_object.data, persistent=True, keys=['status.loop1.exit'], priority=10)
-                        elif snmp_object.snmpvalue == 'FREE':
-                            if snmp_object.device_type == 1:
-                                await self.__amqpconnector_is.send(data=snmp_object.data, persistent=True, keys=['status.loop1.entry'], priority=10)
-                            elif snmp_object.device_type == 2:
-                                await self.__amqpconnector_is.send(data=snmp_object.data, persistent=True, keys=['status.loop1.exit'], priority=10)
-                    elif snmp_object.codename == 'PaymentType':
-                        await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.payment.type'], priority=10)
-                    elif snmp_object.codename == 'PaymentAmount':
-                        await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.payment.amount'], priority=10)
-                    elif snmp_object.codename == 'PaymentCardType':
-                        await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.payment.cardtype'], priority=10)
-                    elif snmp_object.codename == 'PaymentStatus':
-                        if snmp_object.snmpvalue == 'ZONE_PAYMENT':
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.payment.proceeding'], priority=10)
-                        elif snmp_object.snmpvalue == 'FINISHED_WITH_SUCCESS' or snmp_object.snmpvalue == 'FINISHED_WITH_ISSUES':
-                            snmp_object.tra_uid = uuid4()
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.payment.finished'], priority=10)
-                        elif snmp_object.snmpvalue == 'PAYMENT_CANCELLED':
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.payment.cancelled'], priority=10)
-                    elif snmp_object.codename == 'BarrierLoop2Status':
-                        # add uid
-                        if snmp_object.device_type == 1:
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.loop2.entry'], priority=10)
-                        elif snmp_object.device_type == 2:
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.loop2.exit'], priority=10)
-                    elif snmp_object.codename == 'BarrierLoop1Reverse':
-                        if snmp_object.device_type == 1:
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.reverse.entry'], priority=10)
-                        elif snmp_object.device_type == 2:
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.reverse.exit'], priority=10)
-                    elif snmp_object.codename == 'BarrierStatus':
-                        if snmp_object.device_type == 1:
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.barrier.entry'], priority=10)
-                        elif snmp_object.device_type == 2:
-                            await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.barrier.exit'], priority=10)
-                    elif snmp_object.codename == 'General':
-                        await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.general'], priority=9)
-                    elif snmp_object.codename == 'UpperDoor' or snmp_object.codename == 'MiddleDoor':
-                        await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.door'], priority=9)
-                    elif snmp_object.codename in ['IOBoard2.Temperatute', 'IOBoard2.Temperature', 'IOBoard3.Temperature']:
-                        await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.temperature'], priority=9)
-                    elif snmp_object.codename in ['Roboticket1', 'TicketPrinter1']:
-                        await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.tickets', 'event.tickets'], priority=9)
-                    elif snmp_object.codename in ['FiscalPrinterIssues', 'FiscalPrinterBD']:
-                        await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.fiscal', 'event.fiscal'], priority=10)
-                    elif snmp_object.codename == 'NotesReader':
-                        await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.payout', 'event.payout'], priority=10)
-                    elif snmp_object.codename in ['CoinsHopper1', 'CoinsHopper2', 'CoinsHopper3']:
-                        await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.coinhopper'], priority=3)
-                    elif snmp_object.codename == 'Coinbox':
-                        await self.__amqpconnector_is.send(snmp_object.data, persistent=True, keys=['status.coinbox', 'event.coinbox'], priority=3)
-                    await self.__dbconnector_is.callproc('is_processes_upd', rows=0, values=[self.name, 1])
+                # last transaction uid of device is carried by following events of same object
+                transaction = (device['terId'], mib.codename)
+                reading = mib.read(device, val, self.__transactions.get(transaction, DEFAULT_UID))
+                # triggers that produce transaction event
+                # partition events to active that must contain transaction uid and passive that don't contain transaction uid
+                if (reading.codename, reading.value) in transaction_triggers:
+                    reading = reading._replace(tra_uid=str(uuid4()))
+                    self.__transactions[transaction] = reading.tra_uid
+                route = receiving_routes.get(reading.codename)
+                if not route is None:
+                    keys = route_keys(route, reading.value, device['terType'])
+                    if keys:
+                        await self.__amqpconnector_is.send(reading.data, persistent=True, keys=keys, priority=route.priority)
+                await self.__dbconnector_is.callproc('is_processes_upd', rows=0, values=[self.name, 1])
         except Exception as e:
             await self.__logger.error({'module': self.name, 'exception': repr(e)})
-        finally:
-            await asyncio.sleep(0.2)
+
+    async def _worker(self):
+        while True:
+            host, mib, val = await self.__queue.get()
+            # traps of same device are processed in arrival order
+            lock = self.__locks.get(host)
+            if lock is None:
+                lock = self.__locks[host] = asyncio.Lock()
+            async with lock:
+                await self._process(host, mib, val)
+
+    async def _metrics(self):
+        while True:
+            await asyncio.sleep(self.__metrics_interval)
+            received, self.__received = self.__received, 0
+            await self.__logger.info({'module': self.name, 'received': received, 'rate': received/self.__metrics_interval, 'queue': self.__queue.metrics(), 'dedup': self.__dedup.metrics()})
+            await self.__dbconnector_is.callproc('is_processes_upd', rows=0, values=[self.name, 1])
 
     async def _dispatch(self):
         # TODO: notify about server status 
         #pid = os.getpid()
         # await self.__dbconnector_is.callproc('is_processes_ins', rows=0, values=[self.name, 1, os.getpid(), datetime.now()])
-        trap_listener = aiosnmp.SnmpV2TrapServer(host=cs.IS_SNMP_RECEIVER_HOST, port=cs.IS_SNMP_RECEIVER_PORT, communities=("public",), handler=self._handler)
-        await trap_listener.run()
+        for _ in range(self.__workers):
+            asyncio.ensure_future(self._worker())
+        asyncio.ensure_future(self._metrics())
+        if self.__shards > 1:
+            # shards share port, kernel delivers traps of device always to the same shard
+            sock = reuseport_socket(cs.IS_SNMP_RECEIVER_HOST, cs.IS_SNMP_RECEIVER_PORT, self.__shards)
+            await self.eventloop.create_datagram_endpoint(lambda: SnmpTrapProtocol(("public",), self._handler), sock=sock)
+        else:
+            trap_listener = aiosnmp.SnmpV2TrapServer(host=cs.IS_SNMP_RECEIVER_HOST, port=cs.IS_SNMP_RECEIVER_PORT, communities=("public",), handler=self._handler)
+            await trap_listener.run()
 
     async def _signal_cleanup(self):
         await self.__logger.warning({'module': self.name, 'msg': 'Shutting down'})
@@ -151,6 +155,8 @@ class AsyncSNMPReceiver:
         closing_tasks.append(self.__amqpconnector_is.disconnect())
         closing_tasks.append(self.__logger.shutdown())
         await asyncio.gather(*closing_tasks, return_exceptions=True)
+        if not self.__capture is None:
+            self.__capture.close()
 
     async def _signal_handler(self, signal):
         # stop while loop coroutine
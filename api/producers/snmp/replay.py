@@ -0,0 +1,151 @@
+import argparse
+import asyncio
+import ipaddress
+import socket
+from itertools import count
+
+import integration.api.producers.snmp.ber as ber
+from integration.api.producers.snmp.capture import read_capture
+
+
+class FakeAgent(asyncio.DatagramProtocol):
+    # answers GET requests of poller with values of poll capture as of replay clock
+    def __init__(self, ip: str, values: dict, community: str = 'public'):
+        self.__ip = ip
+        self.__values = values
+        self.__community = community
+        self.__transport = None
+        self.served = 0
+
+    def connection_made(self, transport):
+        self.__transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            community, pdu_tag, request_id, oids = ber.decode_request(data)
+        except (IndexError, ValueError):
+            return
+        if community != self.__community:
+            return
+        if pdu_tag == ber.GET_REQUEST:
+            varbinds = [(o, ber.value(self.__values.get((self.__ip, o)))) for o in oids]
+            response = ber.message(community, ber.GET_RESPONSE, request_id, varbinds)
+        else:
+            # only GET is emulated
+            response = ber.message(community, ber.GET_RESPONSE, request_id, [(o, ber.tlv(ber.NULL, b'')) for o in oids],
+                                   error_status=ber.GEN_ERR, error_index=1)
+        self.__transport.sendto(response, addr)
+        self.served += 1
+
+
+class Replay:
+    # feeds capture back to producers: traps are sent to receiver, poll results are served by fake agents.
+    # speed 1 is real time, N is N times faster, 0 is as fast as possible.
+    # Agent of recorded device listens on address from `agents` mapping, devices that aren't mapped get
+    # loopback addresses from `loopback` network in order of recorded addresses. Agents keep serving
+    # `linger` seconds after last record, so poller has time to query them
+    def __init__(self, path: str, speed: float = 1, receiver: tuple = ('127.0.0.1', 162), agent_port: int = 161,
+                 community: str = 'public', bind_source: bool = False, agents: dict = None,
+                 loopback: str = '127.0.1.0/24', linger: float = 0):
+        self.__records = list(read_capture(path))
+        self.__speed = speed
+        self.__receiver = receiver
+        self.__agent_port = agent_port
+        self.__community = community
+        self.__bind_source = bind_source
+        self.__linger = linger
+        self.__values = {}
+        self.__addresses = self._map_agents(agents or {}, loopback)
+        self.__agents = []
+        self.__transports = []
+        # agents that couldn't be started, reported in result of run
+        self.__failed_agents = {}
+        self.__sockets = {}
+        self.__request_id = count(1)
+
+    def _trap_socket(self, ip: str):
+        sock = self.__sockets.get(ip)
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            # receiver resolves device by source address, so send from recorded address when it is local
+            if self.__bind_source:
+                try:
+                    sock.bind((ip, 0))
+                except OSError:
+                    pass
+            sock = self.__sockets[ip] = sock
+        return sock
+
+    def _map_agents(self, agents: dict, loopback: str) -> dict:
+        recorded = sorted({r['ip'] for r in self.__records if r['kind'] == 'poll'}, key=ipaddress.ip_address)
+        hosts = ipaddress.ip_network(loopback).hosts()
+        return {ip: agents[ip] if ip in agents else str(next(hosts)) for ip in recorded}
+
+    async def _start_agents(self):
+        loop = asyncio.get_event_loop()
+        for ip, address in self.__addresses.items():
+            try:
+                transport, agent = await loop.create_datagram_endpoint(lambda: FakeAgent(ip, self.__values, self.__community),
+                                                                       local_addr=(address, self.__agent_port))
+                self.__transports.append(transport)
+                self.__agents.append(agent)
+            except OSError as e:
+                self.__failed_agents[f'{address}:{self.__agent_port}'] = repr(e)
+
+    async def run(self) -> dict:
+        loop = asyncio.get_event_loop()
+        try:
+            await self._start_agents()
+            traps = 0
+            started = loop.time()
+            first_ts = self.__records[0]['ts'] if self.__records else 0
+            lag_max = 0
+            for r in self.__records:
+                if self.__speed:
+                    delay = started + (r['ts'] - first_ts)/self.__speed - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    lag_max = max(lag_max, -delay)
+                if r['kind'] == 'trap':
+                    uptime = int((loop.time() - started)*100)
+                    datagram = ber.trap(self.__community, next(self.__request_id), uptime, r['oid'], [(r['oid'], ber.value(r['value']))])
+                    self._trap_socket(r['ip']).sendto(datagram, self.__receiver)
+                    traps += 1
+                else:
+                    self.__values[(r['ip'], r['oid'])] = r['value']
+            elapsed = loop.time() - started
+            if self.__agents and self.__linger:
+                await asyncio.sleep(self.__linger)
+        finally:
+            for sock in self.__sockets.values():
+                sock.close()
+            for transport in self.__transports:
+                transport.close()
+        return {'records': len(self.__records),
+                'traps': traps,
+                'elapsed': elapsed,
+                'traps_rate': traps/elapsed if elapsed else None,
+                'polls_served': sum(a.served for a in self.__agents),
+                'agents': self.__addresses,
+                'agents_failed': self.__failed_agents,
+                'lag_max': lag_max}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay SNMP capture against local producers')
+    parser.add_argument('capture')
+    parser.add_argument('--speed', default='1', help='1 for real time, N for N times faster, max for no delays')
+    parser.add_argument('--receiver', default='127.0.0.1:162', help='trap receiver address')
+    parser.add_argument('--agent-port', type=int, default=161, help='port of fake agents, poller `port` setting')
+    parser.add_argument('--community', default='public')
+    parser.add_argument('--bind-source', action='store_true', help='send traps from recorded device addresses')
+    parser.add_argument('--agent', action='append', default=[], metavar='RECORDED=LOCAL',
+                        help='address of fake agent for recorded device, can be repeated')
+    parser.add_argument('--loopback', default='127.0.1.0/24', help='network of agent addresses for devices without --agent')
+    parser.add_argument('--linger', type=float, default=0, help='seconds fake agents keep serving after replay')
+    args = parser.parse_args()
+    host, port = args.receiver.rsplit(':', 1)
+    replay = Replay(args.capture, speed=0 if args.speed == 'max' else float(args.speed), receiver=(host, int(port)),
+                    agent_port=args.agent_port, community=args.community, bind_source=args.bind_source,
+                    agents=dict(a.split('=', 1) for a in args.agent), loopback=args.loopback, linger=args.linger)
+    print(asyncio.get_event_loop().run_until_complete(replay.run()))
@@ -0,0 +1,34 @@
+import ctypes
+import socket
+import struct
+
+# linux/asm-generic/socket.h
+SO_ATTACH_REUSEPORT_CBPF = 51
+# linux/filter.h
+SKF_NET_OFF = -0x100000
+BPF_LD_W_ABS = 0x20
+BPF_ALU_MOD_K = 0x94
+BPF_RET_A = 0x16
+
+
+def _program(shards: int) -> bytes:
+    # A = source IPv4 address of datagram; A %= shards; return A as socket index in reuseport group
+    return b''.join(struct.pack('HBBI', code, 0, 0, k) for code, k in ((BPF_LD_W_ABS, (SKF_NET_OFF + 12) & 0xffffffff),
+                                                                       (BPF_ALU_MOD_K, shards),
+                                                                       (BPF_RET_A, 0)))
+
+
+def reuseport_socket(host: str, port: int, shards: int) -> socket.socket:
+    # UDP socket that shares port with other shards, datagrams of same source address
+    # are always delivered to the same socket of the group
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    # program must be attached after bind, otherwise socket gets own reuseport group
+    sock.bind((host, port))
+    code = _program(shards)
+    program = ctypes.create_string_buffer(code, len(code))
+    # struct sock_fprog, buffer must be alive during setsockopt call
+    fprog = struct.pack('HL', len(code)//8, ctypes.addressof(program))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_REUSEPORT_CBPF, fprog)
+    sock.setblocking(False)
+    return sock
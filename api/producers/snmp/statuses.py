@@ -291,3 +291,30 @@ class PaymentStatus(Enum):
     FINISHED_WITH_ISSUES = 3
     OPERATION_TIMEOUT = 4
     UNKNOWN = 5
+
+
+class EnumTable:
+    # flat code -> name list of status map, shifted by offset to cover negative codes.
+    # Names of aliases resolve to canonical member as Enum lookup does
+    __slots__ = ('status_map', 'offset', 'names')
+
+    def __init__(self, status_map):
+        codes = [m.value for m in status_map]
+        self.status_map = status_map
+        self.offset = -min(codes)
+        self.names = [None]*(max(codes) + self.offset + 1)
+        for m in status_map:
+            self.names[m.value + self.offset] = m.name
+
+    def decode(self, value: int) -> str:
+        i = value + self.offset
+        if 0 <= i < len(self.names):
+            name = self.names[i]
+            if not name is None:
+                return name
+        raise ValueError(f'{value} is not a valid {self.status_map.__name__}')
+
+
+# compiled once at import, shared by poller and receiver
+enum_tables = {status_map: EnumTable(status_map) for status_map in list(globals().values())
+               if isinstance(status_map, type) and issubclass(status_map, Enum) and not status_map is Enum}
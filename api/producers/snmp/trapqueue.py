@@ -0,0 +1,77 @@
+import asyncio
+from collections import deque
+
+
+class TrapQueue:
+    # trap queue of at most `maxsize` traps shared by two lanes: critical traps (loop/barrier/payment)
+    # are never dropped, when queue is full they take place of oldest bulk trap or producer waits
+    # while queue is full of critical traps; bulk trap drops oldest bulk trap when queue is full
+    def __init__(self, maxsize: int = 1000):
+        self.__maxsize = maxsize
+        self.__critical = deque()
+        self.__bulk = deque()
+        self.__ready = asyncio.Semaphore(0)
+        self.__space = asyncio.Condition()
+        self.__loop = asyncio.get_event_loop()
+        self.__dropped = 0
+        self.__max_depth = 0
+        self.__latency_sum = 0
+        self.__latency_max = 0
+        self.__processed = 0
+
+    @property
+    def depth(self):
+        return len(self.__critical) + len(self.__bulk)
+
+    async def put(self, item, critical: bool = False):
+        if critical:
+            async with self.__space:
+                await self.__space.wait_for(lambda: self.depth < self.__maxsize or self.__bulk)
+            lane = self.__critical
+        else:
+            if self.depth >= self.__maxsize and not self.__bulk:
+                # queue is full of critical traps
+                self.__dropped += 1
+                return
+            lane = self.__bulk
+        if self.depth >= self.__maxsize:
+            # drop oldest bulk trap, number of items available to consumers stays the same
+            self.__bulk.popleft()
+            self.__dropped += 1
+            lane.append((item, self.__loop.time()))
+            return
+        lane.append((item, self.__loop.time()))
+        self.__max_depth = max(self.__max_depth, self.depth)
+        self.__ready.release()
+
+    async def get(self):
+        await self.__ready.acquire()
+        if self.__critical:
+            item, ts = self.__critical.popleft()
+        else:
+            item, ts = self.__bulk.popleft()
+        # critical producer waiting for space is woken up
+        async with self.__space:
+            self.__space.notify()
+        latency = self.__loop.time() - ts
+        self.__latency_sum += latency
+        self.__latency_max = max(self.__latency_max, latency)
+        self.__processed += 1
+        return item
+
+    # metrics since previous call
+    def metrics(self) -> dict:
+        metrics = {'depth': self.depth,
+                   'critical': len(self.__critical),
+                   'bulk': len(self.__bulk),
+                   'max_depth': self.__max_depth,
+                   'dropped': self.__dropped,
+                   'processed': self.__processed,
+                   'latency_avg': self.__latency_sum/self.__processed if self.__processed else None,
+                   'latency_max': self.__latency_max}
+        self.__max_depth = self.depth
+        self.__dropped = 0
+        self.__latency_sum = 0
+        self.__latency_max = 0
+        self.__processed = 0
+        return metrics
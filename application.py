@@ -188,21 +188,49 @@ class Application:
             payment_listener_proc = Process(target=payment_listener.run, name=payment_listener.name)
             self.processes.append(payment_listener_proc)
             payment_listener_proc.start()
+            # device inventory cache TTL for producers
+            devices_ttl = config['integration'].get('devices', {}).get('ttl', 3600)
             # ping poller process
-            icmp_poller = AsyncPingPoller()
+            icmp_config = config['integration'].get('icmp', {})
+            icmp_poller = AsyncPingPoller(sweep=icmp_config.get('sweep', False),
+                                          changes_only=icmp_config.get('changes_only', False),
+                                          refresh_interval=icmp_config.get('refresh_interval', 600),
+                                          damping=icmp_config.get('damping', None),
+                                          devices_ttl=devices_ttl)
             icmp_poller_proc = Process(target=icmp_poller.run, name=icmp_poller.name)
             self.processes.append(icmp_poller_proc)
             icmp_poller_proc.start()
             # SNMP poller process
-            snmp_poller = AsyncSNMPPoller()
+            snmp_config = config['integration'].get('snmp', {})
+            snmp_poller = AsyncSNMPPoller(devices_ttl=devices_ttl,
+                                          batch=snmp_config.get('batch', False),
+                                          varbinds=snmp_config.get('varbinds', 10),
+                                          max_inflight=snmp_config.get('max_inflight', 64),
+                                          max_per_host=snmp_config.get('max_per_host', None),
+                                          deadline=snmp_config.get('deadline', None),
+                                          intervals=snmp_config.get('intervals', None),
+                                          discovery=snmp_config.get('discovery', False),
+                                          max_repetitions=snmp_config.get('max_repetitions', 25),
+                                          discovery_retry=snmp_config.get('discovery_retry', 600),
+                                          port=snmp_config.get('port', 161),
+                                          capture=snmp_config.get('capture_polls', None))
             snmp_poller_proc = Process(target=snmp_poller.run, name=snmp_poller.name)
             self.processes.append(snmp_poller_proc)
             snmp_poller_proc.start()
-            # SNMP receiver process
-            snmp_receiver = AsyncSNMPReceiver()
-            snmp_receiver_proc = Process(target=snmp_receiver.run, name=snmp_receiver.name)
-            self.processes.append(snmp_receiver_proc)
-            snmp_receiver_proc.start()
+            # SNMP receiver processes, sharded by device address when more than one
+            receiver_shards = snmp_config.get('receiver_shards', 1)
+            for shard in range(receiver_shards):
+                snmp_receiver = AsyncSNMPReceiver(devices_ttl=devices_ttl,
+                                                  workers=snmp_config.get('receiver_workers', 4),
+                                                  queue_size=snmp_config.get('receiver_queue_size', 1000),
+                                                  metrics_interval=snmp_config.get('receiver_metrics_interval', 60),
+                                                  shards=receiver_shards,
+                                                  shard=shard,
+                                                  dedup=snmp_config.get('dedup', None),
+                                                  capture=snmp_config.get('capture_traps', None))
+                snmp_receiver_proc = Process(target=snmp_receiver.run, name=snmp_receiver.name)
+                self.processes.append(snmp_receiver_proc)
+                snmp_receiver_proc.start()
             # webservice
             webservice_proc = Process(target=webservice.run, name=webservice.name)
             self.processes.append(webservice_proc)
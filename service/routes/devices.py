@@ -2,6 +2,7 @@ import asyncio
 import json
 import re
 import sys
+from datetime import datetime
 from itertools import groupby
 from typing import Optional
 
@@ -130,11 +131,13 @@ async def modify_device_config(ter_id, params: DeviceRequestConfig):
             await ws.DBCONNECTOR_IS.callproc('is_column_upd', rows=0, values=[ter_id, params.terminal_address,
                                                                               params.terminal_area_id, params.terminal_type, params.terminal_description, params.ampp_id, params.ampp_type, params.terminal_ip,
                                                                               params.cam_plate_ip, params.cam_photo_1_ip, params.cam_photo_2_ip, params.imager_ip, params.imager_enabled, params.ticket_device])
+            await ws.AMQPCONNECTOR.send({'ter_id': ter_id, 'ts': datetime.now().timestamp()}, persistent=False, keys=['config.devices.changed'], priority=10)
             return Response(status_code=204, media_type='application/json')
         elif cashier:
             await ws.DBCONNECTOR_IS.callproc('is_cashier_upd', values=[ter_id, params.terminal_address,
                                                                        params.terminal_area_id, params.terminal_type, params.terminal_description, params.ampp_id, params.ampp_type, params.terminal_ip, params.cashbox_capacity, params.cashbox_limit,
                                                                        params.uniteller_id, params.uniteller_ip, params.payonline_id, params.uniteller_ip, params.imager_ip, params.imager_enabled])
+            await ws.AMQPCONNECTOR.send({'ter_id': ter_id, 'ts': datetime.now().timestamp()}, persistent=False, keys=['config.devices.changed'], priority=10)
         else:
             data = {'error': 'BAD REQUEST', 'comment': 'Unknown ID'}
             return Response(json.dumps(data, default=str), status_code=403, media_type='application/json')
@@ -150,9 +153,12 @@ async def modify_device_statuses(ter_id, params: DeviceRequstStatus):
         if device:
             if params.operation == 'add':
                 await ws.DBCONNECTOR_IS.callproc('is_status_ins', rows=0, values=[ter_id, params.status])
+                # SNMP poller rebuilds its poll plan
+                await ws.AMQPCONNECTOR.send({'ter_id': ter_id, 'ts': datetime.now().timestamp()}, persistent=False, keys=['config.devices.changed'], priority=10)
                 return Response(status_code=204, media_type='application/json')
             elif params.operation == 'del':
                 await ws.dbconnусtor_is.callproc('is_status_del', rows=0, values=[ter_id, params.status])
+                await ws.AMQPCONNECTOR.send({'ter_id': ter_id, 'ts': datetime.now().timestamp()}, persistent=False, keys=['config.devices.changed'], priority=10)
                 return Response(status_code=204, media_type='application/json')
             else:
                 data = {'error': 'BAD REQUEST', 'comment': 'Unknown ID'}
@@ -4,6 +4,7 @@ from starlette.background import BackgroundTask
 import configuration.settings as cs
 import json
 import asyncio
+from datetime import datetime
 import integration.service.settings as ws
 import configparser
 
@@ -82,4 +83,6 @@ async def initialize():
 @router.get('/api/integration/v1/reload')
 async def reload_configuration():
     await initialize()
+    # producers reload their device registry
+    await ws.AMQPCONNECTOR.send({'ter_id': None, 'ts': datetime.now().timestamp()}, persistent=False, keys=['config.devices.changed'], priority=10)
     return Response(status_code=204)